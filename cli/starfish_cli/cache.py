@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import typer
+
+CACHE_DIR = Path(typer.get_app_dir("starfish")) / "cache"
+
+# switched off by the global --no-cache option
+enabled = True
+
+
+def disable():
+    """Bypass the cache for the rest of this process."""
+    global enabled
+    enabled = False
+
+
+class CachedResponse:
+    """Minimal stand-in for a successful requests.Response served from the cache."""
+
+    ok = True
+    status_code = 200
+
+    def __init__(self, data):
+        self._data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self._data
+
+
+def _path(key: str) -> Path:
+    return CACHE_DIR / f"{hashlib.sha1(key.encode()).hexdigest()}.json"
+
+
+def load(key: str, ttl: float):
+    """Return the cached value for key, or None if missing or older than ttl seconds."""
+    if not enabled:
+        return None
+    path = _path(key)
+    try:
+        if time.time() - path.stat().st_mtime > ttl:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store(key: str, value):
+    """Write value to the cache. Failures are ignored, the cache is best effort."""
+    if not enabled:
+        return
+    path = _path(key)
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def invalidate(key: str):
+    """Drop the cached value for key, if any."""
+    try:
+        _path(key).unlink()
+    except OSError:
+        pass
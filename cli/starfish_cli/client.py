@@ -1,4 +1,43 @@
+import atexit
+import hashlib
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+from starfish_cli import cache
+
+# router endpoints, relative to the API base url
+SITES = "sites/"
+SITES_LOOKUP = "sites/lookup/"
+PROJECTS = "projects/"
+PROJECTS_LOOKUP = "projects/lookup/"
+PARTICIPANTS = "project-participants/"
+PARTICIPANTS_LOOKUP = "project-participants/lookup/"
+RUNS = "runs"
+RUNS_LOOKUP = "runs/lookup/"
+RUNS_DETAIL = "runs/detail/"
+RUNS_FETCH_LOGS = "runs/fetch_logs/"
+RUNS_DOWNLOAD = "runs-action/download/"
+RUNS_ACTION_UPDATE = "runs-action/update/"
+
+# per-object endpoints, pre-bound str.format so callers just pass the id
+site_detail = "sites/{}/".format
+project_detail = "projects/{}/".format
+participant_detail = "project-participants/{}/".format
+run_status = "runs/{}/status/".format
+
+# (connect, read) timeouts in seconds; transfers stream large bodies so get a longer read
+TIMEOUT = (5, 30)
+TRANSFER_TIMEOUT = (5, 300)
+
+# site identity rarely changes, so a short-lived local copy saves a round trip per command
+SITE_CACHE_TTL = 300
+# how long a stored ETag and body are kept for revalidation
+ETAG_CACHE_TTL = 24 * 3600
 
 
 class StarfishClient:
@@ -6,34 +45,112 @@ class StarfishClient:
 
     def __init__(self, config: dict):
         self.base_url = config["router_url"]
+        # joined once here so building a url is a plain concatenation
+        self._base = self.base_url.rstrip("/") + "/"
         self.auth = config["auth"]
         self.site_uid = config["site_uid"]
+        # part of every cache key, so a cached body is never served to other credentials
+        self._identity = hashlib.sha256(":".join(self.auth).encode()).hexdigest()
+        self._timeout = TIMEOUT
+        self._download_timeout = TRANSFER_TIMEOUT
+
+        # one pooled session per client so sequential calls reuse the connection
+        self.session = requests.Session()
+        self.session.auth = self.auth
+        # ACCEPT_ENCODING only advertises br when a brotli decoder is installed
+        self.session.headers.update({"Accept": "application/json", "Accept-Encoding": ACCEPT_ENCODING})
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=16,
+            # POST is left out so a retried gateway error can't create a record twice
+            max_retries=Retry(
+                total=3, connect=3, read=2, backoff_factor=0.2,
+                status_forcelist=(429, 502, 503, 504),
+                allowed_methods=frozenset(["GET", "PUT", "DELETE"]),
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = None
+        atexit.register(self.close)
+
+    def close(self):
+        """Release pooled connections and worker threads."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+        self.session.close()
 
     def _url(self, path: str) -> str:
-        """url full path"""
-        return f"{self.base_url}/{path.lstrip('/')}"
+        """url full path, path is relative and has no leading slash"""
+        return self._base + path
 
     def get(self, path: str, params: dict = None):
-        return requests.get(self._url(path), params=params, auth=self.auth)
+        return self.session.get(self._url(path), params=params, timeout=self._timeout)
 
     def post(self, path: str, data: dict = None):
-        return requests.post(self._url(path), json=data, auth=self.auth)
+        return self.session.post(self._url(path), json=data, timeout=self._timeout)
 
     def put(self, path: str, data: dict = None):
-        return requests.put(self._url(path), json=data, auth=self.auth)
+        return self.session.put(self._url(path), json=data, timeout=self._timeout)
 
     def delete(self, path: str):
-        return requests.delete(self._url(path), auth=self.auth)
+        return self.session.delete(self._url(path), timeout=self._timeout)
+
+    def conditional_get(self, path: str, params: dict = None):
+        """GET that revalidates a stored copy with If-None-Match.
+        On 304 the stored body is served, so an unchanged list costs no body transfer."""
+        url = self._url(path)
+        key = f"etag:{self._identity}:{url}:{sorted((params or {}).items())}"
+        stored = cache.load(key, ETAG_CACHE_TTL)
+        headers = {"If-None-Match": stored["etag"]} if stored else None
+        r = self.session.get(url, params=params, headers=headers, timeout=self._timeout)
+        if r.status_code == 304 and stored:
+            return cache.CachedResponse(stored["body"])
+        etag = r.headers.get("ETag")
+        if r.ok and etag:
+            body = r.json()
+            cache.store(key, {"etag": etag, "body": body})
+            return cache.CachedResponse(body)
+        return r
+
+    def map_get(self, calls: list, max_workers: int = 8) -> list:
+        """Issue GETs for a list of (path, params) pairs concurrently.
+        Responses come back in the same order as calls."""
+        if not calls:
+            return []
+        # one executor per client, shared by every fan-out over the same session
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        return list(self._pool.map(lambda call: self.get(*call), calls))
 
 
     #sites
-    def get_site(self):
-        """Look up this site by its UID."""
-        return self.get("/sites/lookup/", params={"uid": self.site_uid})
+    @property
+    def _site_cache_key(self) -> str:
+        return f"site:{self._identity}:{self.base_url}:{self.site_uid}"
+
+    def get_site(self, use_cache: bool = True):
+        """Look up this site by its UID, serving from the local cache when fresh."""
+        if use_cache:
+            cached = cache.load(self._site_cache_key, SITE_CACHE_TTL)
+            if cached is not None:
+                return cache.CachedResponse(cached)
+        r = self.conditional_get(SITES_LOOKUP, params={"uid": self.site_uid})
+        if r.ok:
+            site = r.json()
+            cache.store(self._site_cache_key, site)
+            # hand back the parsed body so callers don't decode it a second time
+            return cache.CachedResponse(site)
+        return r
+
+    def invalidate_site_cache(self):
+        """Forget the cached site lookup after it changes on the router."""
+        cache.invalidate(self._site_cache_key)
 
     def register_site(self, name: str, description: str):
         """Register this site with the router."""
-        return self.post("/sites/", data={
+        return self.post(SITES, data={
             "uid": self.site_uid,
             "name": name,
             "description": description
@@ -41,28 +158,37 @@ class StarfishClient:
 
     def update_site(self, site_id: int, name: str, description: str):
         """Update site name and description."""
-        return self.put(f"/sites/{site_id}/", data={
+        return self.put(site_detail(site_id), data={
             "name": name,
             "description": description
         })
 
     def deregister_site(self, site_id: int):
         """Remove this site from the router."""
-        return self.delete(f"/sites/{site_id}/")
+        return self.delete(site_detail(site_id))
 
     ##projects
 
     def list_projects(self, site_id: int):
         """List all projects this site is involved in."""
-        return self.get("/projects/lookup/", params={"site_id": site_id})
+        return self.conditional_get(PROJECTS_LOOKUP, params={"site_id": site_id})
 
     def get_project(self, project_id: int):
         """Get a single project by ID."""
-        return self.get(f"/projects/{project_id}/")
+        return self.get(project_detail(project_id))
+
+    def get_project_bundle(self, project_id: int):
+        """Fetch a project and its participants concurrently.
+        Returns (project_response, participants_response)."""
+        project, participants = self.map_get([
+            (project_detail(project_id), None),
+            (PARTICIPANTS_LOOKUP, {"project": project_id}),
+        ])
+        return project, participants
 
     def create_project(self, name: str, description: str, site_id: int, tasks: list):
         """Create a new project. This site becomes the coordinator."""
-        return self.post("/projects/", data={
+        return self.post(PROJECTS, data={
             "name": name,
             "description": description,
             "site": site_id,
@@ -71,11 +197,11 @@ class StarfishClient:
 
     def join_project(self, project_name: str, site_id: int, notes: str = ""):
         """Join an existing project as a participant."""
-        r = self.get("/projects/lookup/", params={"name": project_name})
+        r = self.get(PROJECTS_LOOKUP, params={"name": project_name})
         if not r.ok:
             return r
         project = r.json()
-        return self.post("/project-participants/", data={
+        return self.post(PARTICIPANTS, data={
             "site": site_id,
             "project": project["id"],
             "role": "PA",
@@ -84,51 +210,75 @@ class StarfishClient:
 
     def leave_project(self, participant_id: int):
         """Leave a project by deleting the participant record."""
-        return self.delete(f"/project-participants/{participant_id}/")
+        return self.delete(participant_detail(participant_id))
 
     def get_participants(self, project_id: int):
         """Get all participants for a project."""
-        return self.get("/project-participants/lookup/", params={"project": project_id})
+        return self.get(PARTICIPANTS_LOOKUP, params={"project": project_id})
 
     #runs
 
     def start_run(self, project_id: int):
         """Start a new FL run batch. Coordinator only."""
-        return self.post("/runs", data={"project": project_id})
+        return self.post(RUNS, data={"project": project_id})
 
     def get_runs(self, project_id: int):
         """Get all runs for a project filtered by this site."""
-        return self.get("/runs/lookup/", params={
+        return self.conditional_get(RUNS_LOOKUP, params={
             "project": project_id,
             "site_uid": self.site_uid
         })
 
     def get_run_detail(self, batch: int, project_id: int, site_id: int):
         """Get detailed info for a specific run batch."""
-        return self.get("/runs/detail/", params={
+        return self.get(RUNS_DETAIL, params={
             "batch": batch,
             "project": project_id,
             "site": site_id
         })
 
+    def get_logs(self, run_id: int, task_seq: int, round_seq: int, line: int = 0):
+        """Fetch log lines for a run, starting from the given line."""
+        return self.get(RUNS_FETCH_LOGS, params={
+            "run_id": run_id,
+            "task_seq": task_seq,
+            "round_seq": round_seq,
+            "line": line
+        })
+
     def update_run_status(self, run_id: int, status: int):
         """Update the status of a run (uses integer status codes 0-8)."""
-        return self.put(f"/runs/{run_id}/status/", data={"status": status})
+        return self.put(run_status(run_id), data={"status": status})
 
     
     #downloads
 
-    def download_artifact(self, run_id: int, file_type: str, all_runs: bool = True):
-        """Download artifacts or logs as a ZIP file."""
-        return self.get("/runs-action/download/", params={
+    def download_stream(self, path: str, params: dict, dest_path: str, chunk_size: int = 1 << 20):
+        """Stream a GET response body to dest_path without holding it in memory."""
+        # the payload is already a ZIP, recompressing it in transit only burns CPU on both ends
+        with self.session.get(self._url(path), params=params, stream=True,
+                              headers={"Accept-Encoding": "identity"},
+                              timeout=self._download_timeout) as response:
+            if response.ok:
+                response.raw.decode_content = True
+                with open(dest_path, "wb") as f:
+                    shutil.copyfileobj(response.raw, f, length=chunk_size)
+            else:
+                # read the error body before the connection goes back to the pool
+                response.content
+            return response
+
+    def download_artifact(self, run_id: int, file_type: str, dest_path: str, all_runs: bool = True):
+        """Download artifacts or logs as a ZIP file into dest_path."""
+        return self.download_stream(RUNS_DOWNLOAD, params={
             "run": run_id,
             "type": file_type,
             "all_runs": 1 if all_runs else 0
-        })
+        }, dest_path=dest_path)
 
     def perform_action(self, run_id: int, project_id: int, batch: int, role: str, action: str):
         """Perform a run action: 'stop' or 'restart'."""
-        return self.put("/runs-action/update/", data={
+        return self.put(RUNS_ACTION_UPDATE, data={
             "run": run_id,
             "project": project_id,
             "batch": batch,
@@ -1,7 +1,7 @@
 import os
 import typer
-import requests
 from starfish_cli.config import get_config
+from starfish_cli.client import StarfishClient
 from starfish_cli.output import print_success, print_error
 
 app = typer.Typer(no_args_is_help=True)
@@ -22,29 +22,17 @@ def download(
         print_error(f"Invalid type '{file_type}'. Choose from: {', '.join(VALID_TYPES)}", json_mode=json)
         return
 
-    config = get_config()
-    params = {
-        "run": run_id,
-        "type": file_type,
-        "all_runs": 1 if all_runs else 0,
-    }
+    client = StarfishClient(get_config())
 
-    response = requests.get(
-        f"{config['router_url']}/runs-action/download/",
-        params=params,
-        auth=config["auth"],
-    )
-
-    if not response.ok:
-        print_error(f"Failed to download: {response.text}", json_mode=json)
-        return
-
-    # save the zip file
+    # stream the zip file straight to disk
     os.makedirs(output_dir, exist_ok=True)
     filename = f"run_{run_id}_{file_type}.zip"
     filepath = os.path.join(output_dir, filename)
 
-    with open(filepath, "wb") as f:
-        f.write(response.content)
+    response = client.download_artifact(run_id, file_type, filepath, all_runs=all_runs)
+
+    if not response.ok:
+        print_error(f"Failed to download: {response.text}", json_mode=json)
+        return
 
     print_success(f"Downloaded to {filepath}", json_mode=json)
\ No newline at end of file
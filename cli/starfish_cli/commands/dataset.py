@@ -1,11 +1,12 @@
 import typer
+from requests_toolbelt.multipart.encoder import MultipartEncoder
 from starfish_cli.config import get_config
+from starfish_cli.client import StarfishClient, TIMEOUT, TRANSFER_TIMEOUT
 from starfish_cli.output import print_success, print_error
 
 app = typer.Typer(no_args_is_help=True)
 
 def _client():
-    from starfish_cli.client import StarfishClient
     return StarfishClient(get_config())
 
 @app.command()
@@ -16,7 +17,6 @@ def upload(
 ):
     """Upload a dataset for a run. Changes run status from Standby to Preparing."""
     import os
-    import requests
 
     config = get_config()
 
@@ -27,25 +27,33 @@ def upload(
     controller_url = config["controller_url"]
     dataset_url = f"{controller_url}/controller/runs/dataset/"
 
-    session = requests.Session()
-    session.auth = config["auth"]
-    session.get(f"{controller_url}/controller/")
+    # reuse the client's pooled session for both the CSRF priming GET and the POST
+    session = _client().session
+    session.get(f"{controller_url}/controller/", timeout=TIMEOUT)
     csrf_token = session.cookies.get("csrftoken", "")
 
     with open(file, "rb") as f:
+        # the encoder reads the file in chunks as it is sent instead of building the whole body first
+        body = MultipartEncoder(fields={
+            "run_id": str(run_id),
+            "has_dataset": "true",
+            "csrfmiddlewaretoken": csrf_token,
+            "dataset": (os.path.basename(file), f, "application/octet-stream"),
+        })
         response = session.post(
             dataset_url,
-            data={
-                "run_id": run_id,
-                "has_dataset": "true",
-                "csrfmiddlewaretoken": csrf_token,
+            data=body,
+            headers={
+                "X-CSRFToken": csrf_token,
+                "Referer": f"{controller_url}/",
+                "Content-Type": body.content_type,
             },
-            files={"dataset": f},
-            headers={"X-CSRFToken": csrf_token, "Referer": f"{controller_url}/"},
+            timeout=TRANSFER_TIMEOUT,
         )
 
-    if response.ok and response.json().get("success"):
+    payload = response.json() if response.ok else None
+    if payload and payload.get("success"):
         print_success(f"Dataset uploaded for run {run_id}. Status changed to Preparing.", json_mode=json)
     else:
-        msg = response.json().get("msg", response.text) if response.ok else response.text
+        msg = (payload or {}).get("msg") or response.text
         print_error(f"Failed to upload dataset: {msg}", json_mode=json)
@@ -4,7 +4,7 @@ import typer
 from starfish_cli.config import get_config
 from starfish_cli.client import StarfishClient
 from starfish_cli.output import (
-    print_projects, print_participants, print_success, print_error, print_json
+    print_projects, print_participants, print_success, print_error, print_json, print_table
 )
 
 app = typer.Typer(no_args_is_help=True)
@@ -104,29 +104,22 @@ def detail(
 ):
     
     client = _client()
-    # get project info
-    r = client.get_project(project_id)
+    # project info and participants are independent, fetch both at once
+    r, r2 = client.get_project_bundle(project_id)
     if not r.ok:
         print_error(f"Project {project_id} not found.", json_mode=json)
         return
     project = r.json()
-    # get participants
-    r2 = client.get_participants(project_id)
     participants = r2.json() if r2.ok else []
 
     if json:
         print_json({"success": True, "data": {"project": project, "participants": participants}})
         return
 
-    from rich.console import Console
-    from rich.table import Table
-    console = Console()
-    table = Table(title=f"Project: {project['name']}")
-    table.add_column("Field", style="cyan")
-    table.add_column("Value")
-    table.add_row("ID",          str(project.get("id")))
-    table.add_row("Name",        project.get("name", ""))
-    table.add_row("Description", project.get("description", ""))
-    table.add_row("Batch",       str(project.get("batch", "")))
-    console.print(table)
+    print_table(f"Project: {project['name']}", ["Field", "Value"], [
+        ("ID",          str(project.get("id"))),
+        ("Name",        project.get("name", "")),
+        ("Description", project.get("description", "")),
+        ("Batch",       str(project.get("batch", ""))),
+    ])
     print_participants(participants)
\ No newline at end of file
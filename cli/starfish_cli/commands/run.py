@@ -1,7 +1,9 @@
 import typer
 from starfish_cli.config import get_config
 from starfish_cli.client import StarfishClient
-from starfish_cli.output import print_runs, print_success, print_error, print_json
+from starfish_cli.output import (
+    current_round, print_runs, print_success, print_error, print_json, print_table
+)
 
 app = typer.Typer(no_args_is_help=True)
 
@@ -60,27 +62,16 @@ def detail(
         print_json({"success": True, "data": data})
         return
 
-    from rich.console import Console
-    from rich.table import Table
-    console = Console()
     runs = data.get("runs", [])
-    table = Table(title=f"Run Detail — Batch {batch}, Project {project_id}")
-    table.add_column("Run ID",  style="cyan")
-    table.add_column("Status")
-    table.add_column("Role")
-    table.add_column("Seq")
-    table.add_column("Round")
-    for r in runs:
-        tasks = r.get("tasks", [{}])
-        cfg = tasks[0].get("config", {}) if tasks else {}
-        table.add_row(
-            str(r.get("id", "")),
-            r.get("status", ""),
-            r.get("role", ""),
-            str(r.get("cur_seq", "")),
-            str(cfg.get("current_round", "-")),
-        )
-    console.print(table)
+    columns = (
+        [str(r.get("id", "")) for r in runs],
+        [r.get("status", "") for r in runs],
+        [r.get("role", "") for r in runs],
+        [str(r.get("cur_seq", "")) for r in runs],
+        [current_round(r) for r in runs],
+    )
+    print_table(f"Run Detail — Batch {batch}, Project {project_id}",
+                ["Run ID", "Status", "Role", "Seq", "Round"], zip(*columns))
 
 
 @app.command()
@@ -93,15 +84,7 @@ def logs(
 ):
     """Fetch logs for a specific run."""
     client = _client()
-    r = client.get(
-        "/runs/fetch_logs/",
-        params={
-            "run_id": run_id,
-            "task_seq": task_seq,
-            "round_seq": round_seq,
-            "line": line,
-        }
-    )
+    r = client.get_logs(run_id, task_seq, round_seq, line)
     if not r.ok:
         print_error(f"Failed to fetch logs: {r.text}", json_mode=json)
         return
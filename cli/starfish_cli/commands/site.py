@@ -14,7 +14,8 @@ def _client():
 def info(json: bool = typer.Option(False, "--json", help="Output as JSON")):
     """Show current site info."""
     client = _client()
-    r = client.get_site()
+    # always hit the router here so the displayed status is live
+    r = client.get_site(use_cache=False)
     if r.ok:
         print_site(r.json(), json_mode=json)
     else:
@@ -36,6 +37,7 @@ def register(
         return
     r = client.register_site(name, desc)
     if r.ok or r.status_code == 201:
+        client.invalidate_site_cache()
         print_success(f"Site '{name}' registered successfully.", json_mode=json)
     else:
         print_error(f"Failed to register site: {r.text}", json_mode=json)
@@ -56,6 +58,7 @@ def update(
     site = r.json()
     r = client.update_site(site["id"], name, desc)
     if r.ok:
+        client.invalidate_site_cache()
         print_success(f"Site updated to '{name}'.", json_mode=json)
     else:
         print_error(f"Failed to update site: {r.text}", json_mode=json)
@@ -80,6 +83,7 @@ def deregister(
             return
     r = client.deregister_site(site["id"])
     if r.status_code == 204:
+        client.invalidate_site_cache()
         print_success("Site deregistered successfully.", json_mode=json)
     else:
         print_error(f"Failed to deregister: {r.text}", json_mode=json)
\ No newline at end of file
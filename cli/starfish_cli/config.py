@@ -1,14 +1,21 @@
 import os
+from functools import lru_cache
+from types import MappingProxyType
+
 import typer
-from dotenv import load_dotenv
 
 env_path = os.environ.get("STARFISH_ENV", ".env")
-load_dotenv(env_path, override=True)
 
-def get_config() -> dict:
+@lru_cache(maxsize=1)
+def get_config() -> MappingProxyType:
     """
-    Read config from .env file and return as a dict.
+    Read config from .env file and return it as a read-only mapping.
+    Cached, so the .env file is parsed and validated once per process.
     """
+    # imported here so --help never touches dotenv or the .env file
+    from dotenv import load_dotenv
+    load_dotenv(env_path, override=True)
+
     site_uid = os.getenv("SITE_UID")
     router_url = os.getenv("ROUTER_URL")
     router_username = os.getenv("ROUTER_USERNAME")
@@ -26,11 +33,11 @@ def get_config() -> dict:
         typer.echo(f"[error] Missing required environment variables: {', '.join(missing)}")
         raise typer.Exit(code=1)
 
-    return {
+    return MappingProxyType({
         "site_uid": site_uid,
         "router_url": router_url.rstrip("/"),
         "router_username": router_username,
         "router_password": router_password,
         "auth": (router_username, router_password),
         "controller_url": controller_url.rstrip("/"),
-    }
\ No newline at end of file
+    })
\ No newline at end of file
@@ -1,17 +1,51 @@
+import importlib
+
+import click
 import typer
-from starfish_cli.commands import site, project, run, dataset, artifact
+from typer.core import TyperGroup
+
+# name -> (module, help); each module is only imported when its command runs
+SUBCOMMANDS = {
+    "site":     ("starfish_cli.commands.site",     "Manage this site's registration"),
+    "project":  ("starfish_cli.commands.project",  "Create, join, and manage projects"),
+    "run":      ("starfish_cli.commands.run",      "Start and monitor FL runs"),
+    "dataset":  ("starfish_cli.commands.dataset",  "Upload datasets for runs"),
+    "artifact": ("starfish_cli.commands.artifact", "Download artifacts and logs"),
+}
+
+
+class LazyGroup(TyperGroup):
+    """Top-level group that resolves sub-apps on demand instead of at import."""
+
+    def list_commands(self, ctx: click.Context):
+        return sorted(SUBCOMMANDS)
+
+    def get_command(self, ctx: click.Context, cmd_name: str):
+        if cmd_name not in SUBCOMMANDS:
+            return None
+        module_name, help_text = SUBCOMMANDS[cmd_name]
+        command = typer.main.get_group(importlib.import_module(module_name).app)
+        command.name = cmd_name
+        command.help = help_text
+        return command
+
 
 app = typer.Typer(
     name="starfish",
     help="Starfish-FL CLI",
     no_args_is_help=True,
+    cls=LazyGroup,
 )
 
-app.add_typer(site.app,     name="site",     help="Manage this site's registration")
-app.add_typer(project.app,  name="project",  help="Create, join, and manage projects")
-app.add_typer(run.app,      name="run",      help="Start and monitor FL runs")
-app.add_typer(dataset.app,  name="dataset",  help="Upload datasets for runs")
-app.add_typer(artifact.app, name="artifact", help="Download artifacts and logs")
+
+@app.callback()
+def main(
+    no_cache: bool = typer.Option(False, "--no-cache", help="Skip the local response cache and always refetch"),
+):
+    if no_cache:
+        from starfish_cli import cache
+        cache.disable()
+
 
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
@@ -1,100 +1,120 @@
+import csv
 import json
+import sys
+from functools import lru_cache
+
 import typer
-from rich.console import Console
-from rich.table import Table
 
-console = Console()
+try:
+    import orjson
+except ImportError:  # optional speed-up, fall back to the stdlib encoder
+    orjson = None
+
+
+@lru_cache(maxsize=1)
+def _console():
+    # rich is only imported once something is actually rendered
+    from rich.console import Console
+    return Console()
 
 
 def print_json(data: dict | list):
-    typer.echo(json.dumps(data, indent=2))
+    if orjson is not None:
+        typer.echo(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        typer.echo(json.dumps(data, indent=2))
 
 def print_success(msg: str, json_mode: bool = False):
     if json_mode:
         print_json({"success": True, "msg": msg})
     else:
-        console.print(f"[green]✓[/green] {msg}")
+        _console().print(f"[green]✓[/green] {msg}")
 
 def print_error(msg: str, json_mode: bool = False):
     if json_mode:
         print_json({"success": False, "msg": msg})
     else:
-        console.print(f"[red]✗[/red] {msg}")
+        _console().print(f"[red]✗[/red] {msg}")
+
+
+def print_table(title: str, headers: list, rows):
+    """Render rows as a rich table on a terminal, or as plain TSV when piped."""
+    if not sys.stdout.isatty():
+        writer = csv.writer(sys.stdout, delimiter="\t", lineterminator="\n")
+        writer.writerow(headers)
+        writer.writerows(rows)
+        return
+    from rich.table import Table
+    table = Table(title=title)
+    table.add_column(headers[0], style="cyan")
+    for header in headers[1:]:
+        table.add_column(header)
+    for row in rows:
+        table.add_row(*row)
+    _console().print(table)
 
 
 def print_site(site: dict, json_mode: bool = False):
     if json_mode:
         print_json({"success": True, "data": site})
         return
-    table = Table(title="Site Info")
-    table.add_column("Field", style="cyan")
-    table.add_column("Value")
-    table.add_row("ID",          str(site.get("id", "")))
-    table.add_row("Name",        site.get("name", ""))
-    table.add_row("Description", site.get("description", ""))
-    table.add_row("UID",         site.get("uid", ""))
-    table.add_row("Status",      site.get("status", ""))
-    console.print(table)
+    print_table("Site Info", ["Field", "Value"], [
+        ("ID",          str(site.get("id", ""))),
+        ("Name",        site.get("name", "")),
+        ("Description", site.get("description", "")),
+        ("UID",         site.get("uid", "")),
+        ("Status",      site.get("status", "")),
+    ])
 
 
 def print_projects(projects: list, json_mode: bool = False):
     if json_mode:
         print_json({"success": True, "data": projects})
         return
-    table = Table(title="Projects")
-    table.add_column("ID",          style="cyan")
-    table.add_column("Name")
-    table.add_column("Role")
-    table.add_column("Description")
+    rows = []
     for pp in projects:
         project = pp.get("project", {})
-        table.add_row(
+        rows.append((
             str(project.get("id", "")),
             project.get("name", ""),
             pp.get("role", ""),
             project.get("description", "")[:50],
-        )
-    console.print(table)
+        ))
+    print_table("Projects", ["ID", "Name", "Role", "Description"], rows)
 
 
 def print_participants(participants: list, json_mode: bool = False):
     if json_mode:
         print_json({"success": True, "data": participants})
         return
-    table = Table(title="Project Participants")
-    table.add_column("ID",     style="cyan")
-    table.add_column("Site")
-    table.add_column("Role")
-    table.add_column("Status")
+    rows = []
     for p in participants:
         site = p.get("site", {})
-        table.add_row(
+        rows.append((
             str(p.get("id", "")),
             site.get("name", ""),
             p.get("role", ""),
             site.get("status", ""),
-        )
-    console.print(table)
+        ))
+    print_table("Project Participants", ["ID", "Site", "Role", "Status"], rows)
+
+
+def current_round(run: dict) -> str:
+    """Current round of a run's first task, or '-' when it has none."""
+    tasks = run.get("tasks") or [{}]
+    return str(tasks[0].get("config", {}).get("current_round", "-"))
 
 
 def print_runs(runs: list, json_mode: bool = False):
     if json_mode:
         print_json({"success": True, "data": runs})
         return
-    table = Table(title="Runs")
-    table.add_column("ID",     style="cyan")
-    table.add_column("Batch")
-    table.add_column("Status")
-    table.add_column("Round")
-    table.add_column("Role")
-    for r in runs:
-        tasks = r.get("tasks", [{}])
-        current_round = tasks[0].get("config", {}).get("current_round", "-") if tasks else "-"
-        table.add_row(
-            str(r.get("id", "")),
-            str(r.get("batch", "")),
-            r.get("status", ""),
-            str(current_round),
-            r.get("role", ""),
-        )
-    console.print(table)
\ No newline at end of file
+    # build each column in one pass, then zip them into rows
+    columns = (
+        [str(r.get("id", "")) for r in runs],
+        [str(r.get("batch", "")) for r in runs],
+        [r.get("status", "") for r in runs],
+        [current_round(r) for r in runs],
+        [r.get("role", "") for r in runs],
+    )
+    print_table("Runs", ["ID", "Batch", "Status", "Round", "Role"], zip(*columns))
\ No newline at end of file
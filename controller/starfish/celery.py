@@ -1,12 +1,18 @@
-import json
+import functools
+import importlib
 import os
+import pkgutil
+import time
+
+import orjson
 import requests
-from celery import Celery
+from cachetools import TTLCache
+from celery import Celery, group
 from celery.utils.log import get_task_logger
 from kombu import Exchange, Queue
 from starfish.controller import redis
 from starfish.controller.site_status_task import report_alive
-from starfish.controller.utils import load_class, camel_to_snake, format_status, epoch_time_in_sec
+from starfish.controller.utils import load_class, camel_to_snake, format_status
 
 logger = get_task_logger(__name__)
 
@@ -28,11 +34,60 @@ router_username = os.getenv('ROUTER_USERNAME')
 router_password = os.getenv('ROUTER_PASSWORD')
 site_id = os.getenv('SITE_UID')
 
+# Keep-alive session shared by every poll so beats reuse the router connection
+router_session = requests.Session()
+router_session.auth = (router_username, router_password)
+router_session.headers.update({'Content-Type': 'application/json'})
+active_runs_url = '{0}/runs/active/'.format(router_url)
+
 run_key = 'starfish:controller:run:list:'
+# cached runs expire after a day
+run_ttl = 86400
+
+# poll_run runs the coordinator retry check at most this often, in seconds
+monitor_interval = 10
+last_monitor_at = 0.0
+
+
+def redis_key(run_id):
+    return f"{run_key}{run_id}"
+
+
+def status_key(run_id):
+    # the formatted status alone, so pollers compare without decoding the run
+    return f"{run_key}status:{run_id}"
+
+# Keep singleton ml model instance, dropped after a day without use
+ml_models = TTLCache(maxsize=1024, ttl=86400)
+
+
+@app.task(bind=True, queue='starfish.run', name='poll_run')
+def poll_run(args):
+    """
+    Poll active runs once and drive both the status-change dispatch of
+    fetch_run and the coordinator retry of monitor_run from that payload.
+    :return:
+    """
+    global last_monitor_at
+    run_list = fetch()
+    if not run_list:
+        return
+    site_runs = [r for r in run_list if r['site_uid'] == site_id]
+    cached_statuses = get_statuses_from_redis(site_runs)
+
+    # retries are judged against the cache before it's refreshed below,
+    # so a run that just changed status is dispatched once, not retried too
+    retry_run = []
+    now = time.monotonic()
+    if now - last_monitor_at >= monitor_interval:
+        last_monitor_at = now
+        retry_run = find_retry_runs(site_runs, cached_statuses)
 
-# Keep singleton ml model instance
-ml_models = dict()
-ml_models_alive = dict()
+    changed_run = find_changed_runs(site_runs, cached_statuses)
+    add_all_to_redis(changed_run)
+
+    dispatch([process_task.s(run, False) for run in changed_run] +
+             [process_task.s(run, True) for run in retry_run])
 
 
 @app.task(bind=True, queue='starfish.run', name='fetch_run')
@@ -45,9 +100,7 @@ def fetch_run(args):
 
     runs = check_status_change(site_id)
     if runs:
-        for run in runs:
-            process_task.s(run, False).apply_async(
-                queue='starfish.processor')
+        dispatch([process_task.s(run, False) for run in runs])
 
 
 @app.task(bind=True, queue='starfish.run', name='monitor_run')
@@ -59,21 +112,11 @@ def monitor_run(args):
     """
     run_list = fetch()
     if run_list:
-        retry_run = []
-        for r in run_list:
-            if r['site_uid'] == site_id and r['role'] == 'coordinator':
-                exist_run = get_run_from_redis(r)
-                if exist_run:
-                    run = json.loads(exist_run)
-                    r_status = format_status(r['status'])
-                    if r_status == format_status(run['status']) and \
-                            r_status in ['preparing', 'preparing', 'pending_aggregating']:
-                        retry_run.append(r)
+        site_runs = [r for r in run_list if r['site_uid'] == site_id]
+        retry_run = find_retry_runs(site_runs, get_statuses_from_redis(site_runs))
 
         if retry_run:
-            for run in retry_run:
-                process_task.s(run, True).apply_async(
-                    queue='starfish.processor')
+            dispatch([process_task.s(run, True) for run in retry_run])
 
 
 @app.task(bind=True, queue='starfish.run', name='site_heartbeat')
@@ -81,16 +124,6 @@ def heartbeat(args):
     report_alive()
 
 
-def refresh_model(run_id):
-    now = epoch_time_in_sec()
-    ml_models_alive[run_id] = now
-    for i in ml_models_alive.keys():
-        v = ml_models_alive[i]
-        if v < now - 86400:
-            ml_models.pop(i)
-            ml_models_alive.pop(i)
-
-
 @app.task(bind=True, queue='starfish.processor', name='process_task')
 def process_task(args, run, is_retry):
     """
@@ -108,43 +141,79 @@ def process_task(args, run, is_retry):
     model_id = "{}_{}".format(run_id, cur_seq)
     
     try:
-        snake_name = camel_to_snake(model)
-        klass = None
-        # Try loading from main tasks module first, then stats_models subpackage
-        module_paths = [
-            'starfish.controller.tasks.{}'.format(snake_name),
-            'starfish.controller.tasks.stats_models.{}'.format(snake_name)
-        ]
-        for module_path in module_paths:
-            try:
-                klass = load_class(module_path, model)
-                if klass is not None:
-                    break
-            except (ImportError, AttributeError):
-                continue
-        
-        if klass is None:
-            raise ImportError(f"Model {model} not found in any module path")
+        klass = task_registry().get(model) or load_task_class(model)
         
-        if model_id in ml_models:
-            instance = ml_models[model_id]
-        else:
+        instance = ml_models.get(model_id)
+        if instance is None:
             instance = klass(run)
-            ml_models[model_id] = instance
-        refresh_model(model_id)
+        # re-inserting restarts the ttl, so models still in use are never evicted
+        ml_models[model_id] = instance
         instance.method_call(status, run, is_retry)
 
     except (ImportError, AttributeError) as e:
         logger.warn("{} not found with error: {}".format(model, e))
 
 
+def dispatch(signatures):
+    """
+    Publish process_task signatures to the processor queue as one group
+    :param signatures: process_task signatures
+    """
+    if signatures:
+        group(signatures).apply_async(queue='starfish.processor')
+
+
+task_packages = ['starfish.controller.tasks',
+                 'starfish.controller.tasks.stats_models']
+
+
+@functools.lru_cache(maxsize=None)
+def task_registry():
+    """
+    Map model names to task classes, scanning the task packages once per
+    worker instead of importing the model module on every message
+    :return: {model_name: class}
+    """
+    from starfish.controller.tasks.abstract_task import AbstractTask
+
+    registry = {}
+    for package_name in task_packages:
+        package = importlib.import_module(package_name)
+        for module_info in pkgutil.iter_modules(package.__path__):
+            if module_info.ispkg:
+                continue
+            module_name = '{}.{}'.format(package_name, module_info.name)
+            try:
+                module = importlib.import_module(module_name)
+            except ImportError as e:
+                logger.warn("{} skipped with error: {}".format(module_name, e))
+                continue
+            for name, klass in vars(module).items():
+                if isinstance(klass, type) and issubclass(klass, AbstractTask) \
+                        and klass is not AbstractTask \
+                        and klass.__module__ == module_name:
+                    # main tasks package wins over stats_models on a clash
+                    registry.setdefault(name, klass)
+    return registry
+
+
+def load_task_class(model):
+    """
+    Resolve a model not in the registry by its module naming convention
+    :param model: model class name
+    :return: task class
+    """
+    snake_name = camel_to_snake(model)
+    for package_name in task_packages:
+        try:
+            return load_class('{}.{}'.format(package_name, snake_name), model)
+        except (ImportError, AttributeError):
+            continue
+    raise ImportError(f"Model {model} not found in any module path")
+
+
 def fetch():
-    headers = {'Content-type': 'application/json'}
-    data = dict()
-    response = requests.get('{0}/runs/active/'.format(router_url),
-                            headers=headers,
-                            auth=(router_username, router_password),
-                            data=json.dumps(data))
+    response = router_session.get(active_runs_url, timeout=5)
     if response.ok:
         return response.json()
     else:
@@ -158,43 +227,99 @@ def check_status_change(site_uid) -> []:
     """
     run_list = fetch()
     if run_list:
-        changed_run = []
-        for r in run_list:
-            if r['site_uid'] == site_uid:
-                exist_run = get_run_from_redis(r)
-                if exist_run:
-                    run = json.loads(exist_run)
-                    if format_status(r['status']) != format_status(run['status']):
-                        changed_run.append(r)
-                        add_to_redis(r)
-                else:
-                    changed_run.append(r)
-                    add_to_redis(r)
+        site_runs = [r for r in run_list if r['site_uid'] == site_uid]
+        changed_run = find_changed_runs(site_runs, get_statuses_from_redis(site_runs))
+        add_all_to_redis(changed_run)
         return changed_run
     return None
 
 
-def get_run_from_redis(run):
+def find_changed_runs(runs, cached_statuses):
+    """
+    Runs that are new or whose status differs from the cached one
+    :param runs: runs from the router
+    :param cached_statuses: cached statuses aligned with runs, None if not cached
+    """
+    changed_run = []
+    for r, cached_status in zip(runs, cached_statuses):
+        if cached_status is not None and format_status(r['status']) == cached_status:
+            continue
+        changed_run.append(r)
+    return changed_run
+
+
+def find_retry_runs(runs, cached_statuses):
+    """
+    Coordinator runs still waiting in the same status as the cached one
+    :param runs: runs from the router
+    :param cached_statuses: cached statuses aligned with runs, None if not cached
+    """
+    retry_run = []
+    for r, cached_status in zip(runs, cached_statuses):
+        if r['role'] == 'coordinator' and cached_status is not None:
+            r_status = format_status(r['status'])
+            if r_status == cached_status and \
+                    r_status in ['preparing', 'preparing', 'pending_aggregating']:
+                retry_run.append(r)
+    return retry_run
+
+
+def get_statuses_from_redis(runs):
+    """
+    Fetch the cached statuses of several runs with a single MGET.
+    :return: list aligned with runs, None where a run is not cached
+    """
+    if not runs:
+        return []
     r = redis.get_redis()
-    return r.get(run_key + str(run['id']))
+    return [s.decode() if s is not None else None
+            for s in r.mget([status_key(run['id']) for run in runs])]
 
 
 def add_to_redis(run):
-    r = redis.get_redis()
-    k = run_key + str(run['id'])
-    r.set(k, json.dumps(run), ex=86400)
+    add_all_to_redis([run])
+
+
+def add_all_to_redis(runs):
+    """
+    Cache several runs in one pipelined round-trip.
+    """
+    if not runs:
+        return
+    pipe = redis.get_redis().pipeline(transaction=False)
+    for run in runs:
+        pipe.set(redis_key(run['id']), orjson.dumps(run), ex=run_ttl)
+        pipe.set(status_key(run['id']), format_status(run['status']), ex=run_ttl)
+    pipe.execute()
 
 
 def remove_from_redis(run_id):
     r = redis.get_redis()
-    k = run_key + str(run_id)
-    r.delete(k)
+    r.delete(redis_key(run_id), status_key(run_id))
 
 
-def reset_cache():
-    r = redis.get_redis()
-    for key in r.scan_iter(run_key+'*'):
-        r.delete(key)
+# One SCAN page per call: matching keys are unlinked server side and the
+# next cursor is returned, so Redis is never blocked for the whole keyspace
+unlink_page_script = """
+local page = redis.call('SCAN', ARGV[1], 'MATCH', KEYS[1], 'COUNT', ARGV[2])
+if #page[2] > 0 then
+    redis.call('UNLINK', unpack(page[2]))
+end
+return page[1]
+"""
+
+
+def reset_cache(batch_size=500):
+    """
+    Drop all cached runs. Each SCAN page is matched and unlinked inside
+    Redis, one round-trip per page instead of shipping keys to the client.
+    """
+    unlink_page = redis.get_redis().register_script(unlink_page_script)
+    cursor = 0
+    while True:
+        cursor = int(unlink_page(keys=[run_key + '*'], args=[cursor, batch_size]))
+        if cursor == 0:
+            break
 
 
 reset_cache()
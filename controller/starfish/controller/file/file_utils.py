@@ -1,8 +1,14 @@
+import collections
+import io
 import logging
+import os
+import shutil
 import tempfile
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import orjson
 import pandas as pd
 
 logger = logging.getLogger(__name__)
@@ -19,14 +25,34 @@ artifacts_name = 'artifacts'
 
 dataset_name = 'dataset'
 
+# below this many members, extracting serially beats the thread pool overhead
+parallel_extract_min_files = 32
+
+# bytes copied per write when extracting, larger than zipfile's 64KiB default
+extract_buffer_size = 1024 * 1024
+
+# bytes copied per read when spooling an archive streamed from the router
+download_chunk_size = 1024 * 1024
+
+# bytes written per chunk when saving an uploaded dataset, 16x Django's default
+upload_chunk_size = 1024 * 1024
+
+
+# parent directories already created by this process
+created_dirs = set()
+
 
 def create_if_not_exist(url):
+    """
+    Make sure the parent directory of url exists. The file itself is created
+    by whoever opens it for writing next.
+    """
     if url:
         try:
-            file_path = Path(url)
-            if not file_path.exists():
-                file_path.parent.mkdir(parents=True, exist_ok=True)
-                file_path.touch()
+            parent = Path(url).parent
+            if parent not in created_dirs:
+                parent.mkdir(parents=True, exist_ok=True)
+                created_dirs.add(parent)
         except Exception as e:
             logger.warning(
                 "Error while creating log file: {} due to".format(e))
@@ -47,6 +73,18 @@ def gen_dataset_url(run_id):
     return f"{base_folder}/{run_id}/"
 
 
+def save_dataset(run_id, uploaded):
+    """
+    Write an uploaded dataset where load_dataset_by_run reads it, in large
+    chunks. A new upload replaces the run's previous dataset.
+    """
+    url = gen_dataset_url(run_id) + dataset_name
+    create_if_not_exist(url)
+    with open(url, 'wb', buffering=upload_chunk_size) as f:
+        for chunk in uploaded.chunks(chunk_size=upload_chunk_size):
+            f.write(chunk)
+
+
 def gen_logs_url(run_id, task_seq, round_seq):
     return gen_url(run_id, task_seq, round_seq, file_name=logs_name)
 
@@ -71,38 +109,119 @@ def downloaded_artifacts_url(run_id, task_seq, round_seq):
     return f"{base_folder}/{artifacts_name}/{run_id}/{task_seq}/{round_seq}/"
 
 
-def download_all_mid_artifacts(project_id, batch, content):
+def downloaded_artifacts_etag_url(run_id, task_seq, round_seq):
+    dir_url = downloaded_artifacts_url(run_id, task_seq, round_seq)
+    return dir_url.rstrip('/') + '.etag' if dir_url else None
+
+
+def read_artifacts_etag(run_id, task_seq, round_seq):
+    """
+    ETag of the artifacts archive last extracted for this round, None if
+    nothing was downloaded yet
+    """
+    url = downloaded_artifacts_etag_url(run_id, task_seq, round_seq)
+    if not url or not os.path.isdir(downloaded_artifacts_url(run_id, task_seq, round_seq)):
+        return None
+    try:
+        with open(url, 'r') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def save_artifacts_etag(run_id, task_seq, round_seq, etag):
+    url = downloaded_artifacts_etag_url(run_id, task_seq, round_seq)
+    if url and etag:
+        with open(url, 'w') as f:
+            f.write(etag)
+
+
+def _member_path(root, name):
+    # same sanitising zipfile applies on extract: drop empty, '.' and '..' parts
+    return os.path.join(root, *[p for p in name.split('/') if p not in ('', '.', '..')])
+
+
+def _write_members(zip_ref, infos, root):
+    for info in infos:
+        target = _member_path(root, info.filename)
+        if info.is_dir() or target == root:
+            continue
+        with zip_ref.open(info) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, extract_buffer_size)
+
+
+def _zip_source(content):
+    # bytes are read in place, anything else is taken as a path to the archive
+    return io.BytesIO(content) if isinstance(content, bytes) else content
+
+
+def _extract_chunk(content, infos, root):
+    # ZipFile handles are not safe to share across threads, each worker opens its own
+    with zipfile.ZipFile(_zip_source(content), 'r') as zip_ref:
+        _write_members(zip_ref, infos, root)
+
+
+def extract_zip(content, dir_url, max_workers=8):
+    """
+    Extract a zip archive into dir_url. content is either the archive bytes
+    or the path of an archive on disk.
+    Archives with many members are written out by a thread pool.
+    """
+    file_path = Path(dir_url)
+    file_path.mkdir(parents=True, exist_ok=True)
+    root = str(file_path)
+
+    with zipfile.ZipFile(_zip_source(content), 'r') as zip_ref:
+        infos = zip_ref.infolist()
+        # create directories up front so writers never race on makedirs
+        targets = [_member_path(root, info.filename) for info in infos]
+        dirs = {target if info.is_dir() else os.path.dirname(target)
+                for info, target in zip(infos, targets)}
+        for directory in dirs:
+            os.makedirs(directory, exist_ok=True)
+        if len(infos) < parallel_extract_min_files:
+            _write_members(zip_ref, infos, root)
+            return file_path.absolute()
+
+    chunks = [infos[i::max_workers] for i in range(max_workers)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda chunk: _extract_chunk(content, chunk, root), chunks))
+    return file_path.absolute()
+
+
+def extract_zip_stream(stream, dir_url):
+    """
+    Spool a zip archive read from a file-like stream to a temp file and
+    extract it into dir_url.
+    A zip's directory sits at its end, so the archive has to land somewhere
+    first; spooling to disk keeps large downloads out of memory.
+    """
+    with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as spool:
+        shutil.copyfileobj(stream, spool, download_chunk_size)
+    try:
+        return extract_zip(spool.name, dir_url)
+    finally:
+        os.remove(spool.name)
+
+
+def download_all_mid_artifacts(project_id, batch, stream):
     dir_url = gen_all_mid_artifacts_url(project_id, batch)
     if dir_url:
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file.write(content)
-        file_path = Path(dir_url)
-        file_path.mkdir(parents=True, exist_ok=True)
-
-        with zipfile.ZipFile(temp_file.name, 'r') as zip_ref:
-            zip_ref.extractall(file_path)
-        return file_path.absolute()
+        return extract_zip_stream(stream, dir_url)
     return None
 
 
-def download_artifacts(run_id, task_seq, round_seq, content):
+def download_artifacts(run_id, task_seq, round_seq, stream):
     dir_url = downloaded_artifacts_url(run_id, task_seq, round_seq)
     if dir_url:
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file.write(content)
-        file_path = Path(dir_url)
-        file_path.mkdir(parents=True, exist_ok=True)
-
-        with zipfile.ZipFile(temp_file.name, 'r') as zip_ref:
-            zip_ref.extractall(file_path)
-        return file_path.absolute()
+        return extract_zip_stream(stream, dir_url)
     return None
 
 
-def read_file_from_url(url):
+def read_file_from_url(url, mode='r'):
     if url:
         try:
-            file_obj = open(url, 'r')
+            file_obj = open(url, mode)
             return file_obj
         except FileNotFoundError:
             logger.warning("File not found at {}".format(url))
@@ -110,14 +229,69 @@ def read_file_from_url(url):
     return None
 
 
+def iter_files(directory, suffix):
+    """
+    Yield the path of every file under directory whose name ends with suffix.
+    os.scandir hands back names and file types from the directory listing
+    itself, so the walk builds no Path objects and makes no stat calls;
+    a missing directory yields nothing.
+    """
+    stack = [directory]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith(suffix):
+                        yield entry.path
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+
+
+def _read_json_lines(path):
+    with open(path, 'rb') as f:
+        return [orjson.loads(line) for line in f]
+
+
+def iter_json_lines(directory, suffix, max_workers=8):
+    """
+    Yield the records of every file under directory whose name ends with
+    suffix, one JSON record per line, file by file.
+    Up to max_workers files are read ahead by a thread pool, so storage
+    round-trips overlap while only that window is held in memory.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window = collections.deque()
+        for path in iter_files(directory, suffix):
+            window.append(executor.submit(_read_json_lines, path))
+            if len(window) >= max_workers:
+                yield from window.popleft().result()
+        while window:
+            yield from window.popleft().result()
+
+
+def load_json_lines(directory, suffix, max_workers=8):
+    """
+    Parse every file under directory whose name ends with suffix, one JSON record per line.
+    :return: records of all files, file by file
+    """
+    return list(iter_json_lines(directory, suffix, max_workers))
+
+
 def load_dataset_by_run(run_id):
     combined_csv_file = read_file_from_url(gen_dataset_url(run_id) + 'dataset')
     if combined_csv_file:
-        try:
-            combined_data = pd.read_csv(combined_csv_file, header=None)
-            X = combined_data.iloc[:, :-1].values
-            y = combined_data.iloc[:, -1].values
-            return X, y
-        except Exception as e:
-            logger.warning("Failed to read data set due to {}".format(e))
+        with combined_csv_file:
+            try:
+                combined_data = pd.read_csv(combined_csv_file, header=None)
+                if combined_data.dtypes.nunique() == 1:
+                    # single dtype: convert once, X and y are views of the same array
+                    data = combined_data.to_numpy()
+                    return data[:, :-1], data[:, -1]
+                X = combined_data.iloc[:, :-1].values
+                y = combined_data.iloc[:, -1].values
+                return X, y
+            except Exception as e:
+                logger.warning("Failed to read data set due to {}".format(e))
     return None, None
@@ -2,8 +2,18 @@ import redis as redis
 
 from starfish.settings import REDIS_HOST, REDIS_PORT, REDIS_DB
 
-pool = redis.ConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
+# Bounded pool: callers wait up to `timeout` seconds for a free connection
+# instead of opening new ones without limit during worker bursts.
+pool = redis.BlockingConnectionPool(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB,
+                                    max_connections=32, timeout=5,
+                                    socket_timeout=2, socket_keepalive=True,
+                                    health_check_interval=30)
+
+# Redis clients are thread-safe over a shared pool, so one instance is reused.
+# Celery prefork children are covered by the pool itself: it compares the
+# owning pid on checkout and drops connections inherited across a fork.
+client = redis.Redis(connection_pool=pool)
 
 
 def get_redis():
-    return redis.Redis(connection_pool=pool)
+    return client
@@ -1,18 +1,39 @@
 import atexit
-import json
+import functools
 import logging
 import os
 
+import orjson
 import requests
 from dotenv import load_dotenv
 
-load_dotenv()
 logger = logging.getLogger(__name__)
 
-site_uid = os.getenv('SITE_UID')
-router_url = os.getenv('ROUTER_URL')
-router_username = os.getenv('ROUTER_USERNAME')
-router_password = os.getenv('ROUTER_PASSWORD')
+
+@functools.lru_cache(maxsize=1)
+def get_env():
+    """
+    Read the site settings once, on first heartbeat rather than at import
+    """
+    load_dotenv()
+    router_url = os.getenv('ROUTER_URL')
+    return {
+        'site_uid': os.getenv('SITE_UID'),
+        'router_url': router_url,
+        'router_username': os.getenv('ROUTER_USERNAME'),
+        'router_password': os.getenv('ROUTER_PASSWORD'),
+        'heartbeat_url': f"{router_url}/sites/heartbeat/",
+    }
+
+
+@functools.lru_cache(maxsize=1)
+def get_session():
+    # Heartbeats fire every few seconds, reuse one keep-alive connection for them
+    env = get_env()
+    session = requests.Session()
+    session.auth = (env['router_username'], env['router_password'])
+    session.headers.update({'Content-Type': 'application/json'})
+    return session
 
 
 def report_alive():
@@ -24,14 +45,15 @@ def report_exit():
 
 
 def send_status(status):
+    env = get_env()
+    site_uid = env['site_uid']
     if site_uid:
-        data = dict()
-        data['uid'] = site_uid
-        data['status'] = status
-        response = requests.post('{0}/sites/heartbeat/'.format(router_url),
-                                 headers={'Content-Type': 'application/json'},
-                                 auth=(router_username, router_password),
-                                 data=json.dumps(data))
+        try:
+            response = get_session().post(env['heartbeat_url'],
+                                          data=orjson.dumps({'uid': site_uid, 'status': status}),
+                                          timeout=3)
+        except requests.RequestException:
+            response = None
         if not response or not response.ok:
             logger.debug(
                 'Failed to report status {}  of site {}'.format(status, site_uid))
@@ -1,26 +1,143 @@
-import inspect
-import json
+import atexit
+import contextlib
+import functools
 import logging
 import os
-import traceback
+import queue
+import shutil
+import threading
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
 
+import orjson
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+from urllib3.util.retry import Retry
 
 from starfish.controller.file import file_utils
 from starfish.controller.file.file_utils import read_file_from_url, gen_logs_url, download_all_mid_artifacts, \
     gen_mid_artifacts_url, create_if_not_exist, gen_artifacts_url, download_artifacts
-# take environment variables from .env.
-from starfish.controller.utils import format_status
+from starfish.controller.utils import run_status, failed_statuses
+
+@dataclass(frozen=True)
+class RouterCfg:
+    site_uid: str
+    url: str
+    username: str
+    password: str
+    download_url: str
+    upload_url: str
+    runs_url: str
+    runs_detail_url: str
+
+
+@functools.lru_cache(maxsize=1)
+def router_cfg() -> RouterCfg:
+    """
+    Router settings and endpoint prefixes, read from the environment on first use
+    """
+    # take environment variables from .env.
+    load_dotenv()
+    url = os.getenv('ROUTER_URL')
+    return RouterCfg(
+        site_uid=os.getenv('SITE_UID'),
+        url=url,
+        username=os.getenv('ROUTER_USERNAME'),
+        password=os.getenv('ROUTER_PASSWORD'),
+        download_url=f'{url}/runs-action/download/',
+        upload_url=f'{url}/runs-action/upload/',
+        runs_url=f'{url}/runs/',
+        runs_detail_url=f'{url}/runs/detail/',
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def get_session():
+    # Every task instance talks to the same router, share keep-alive connections.
+    # No session-wide Content-Type: upload() posts multipart bodies.
+    cfg = router_cfg()
+    session = requests.Session()
+    session.auth = (cfg.username, cfg.password)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16,
+                          max_retries=Retry(total=3, backoff_factor=0.2))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+# (connect, read) timeout for the run status lookups
+fetch_runs_timeout = (5, 30)
+# (connect, read) timeout for artifact downloads and uploads; the read timeout
+# bounds each wait on the socket, not the whole transfer
+download_timeout = (5, 60)
+
+logger = logging.getLogger(__name__)
+
+# Status notifications are sent in order by one background writer, so a state
+# handler's remaining work overlaps them; method_call waits for the queue to
+# drain before the task returns and re-raises the first failed PUT there. A notify
+# identical to the last one still queued for its URL is dropped; earlier ones
+# don't count, or A, B, A would end in B.
+notify_queue = queue.Queue()
+# url -> (body, seq) of the latest notify queued for it and not yet taken
+last_notifies = {}
+notify_seq = 0
+# exceptions from failed PUTs, raised by the next flush_notifies
+notify_errors = []
+notify_lock = threading.Lock()
+notify_writer = None
+
+
+def _send_notifies():
+    headers = {'Content-type': 'application/json'}
+    while True:
+        url, body, seq = notify_queue.get()
+        with notify_lock:
+            if last_notifies.get(url, (None, None))[1] == seq:
+                del last_notifies[url]
+        try:
+            get_session().put(url, headers=headers, data=body, timeout=fetch_runs_timeout)
+        except Exception as e:
+            logger.warning("Failed to notify {} with {}: {}".format(url, body, e))
+            with notify_lock:
+                notify_errors.append(e)
+        finally:
+            notify_queue.task_done()
 
-load_dotenv()
 
-# read vars from env
-site_uid = os.getenv('SITE_UID')
-router_url = os.getenv('ROUTER_URL')
-router_username = os.getenv('ROUTER_USERNAME')
-router_password = os.getenv('ROUTER_PASSWORD')
+def enqueue_notify(url, body):
+    global notify_writer, notify_seq
+    with notify_lock:
+        if last_notifies.get(url, (None, None))[0] == body:
+            return
+        notify_seq += 1
+        seq = notify_seq
+        last_notifies[url] = (body, seq)
+        # started lazily so forked worker processes each get their own writer
+        if notify_writer is None or not notify_writer.is_alive():
+            notify_writer = threading.Thread(target=_send_notifies, name='notify-writer', daemon=True)
+            notify_writer.start()
+        # queued under the lock, so the queue order matches the sequence numbers
+        notify_queue.put((url, body, seq))
+
+
+@atexit.register
+def flush_notifies():
+    """
+    Wait for the queued notifies to be sent, then raise the first one that failed
+    """
+    if notify_writer is not None and notify_writer.is_alive():
+        notify_queue.join()
+    with notify_lock:
+        errors = notify_errors[:]
+        notify_errors.clear()
+    if errors:
+        raise errors[0]
 
 
 class AbstractTask(ABC):
@@ -33,10 +150,17 @@ class AbstractTask(ABC):
     batch_id = None
     cur_seq = None
     tasks = None
+    # config of the current task, set with cur_seq in post_init
+    cur_config = None
     role = None
     artifact = None
     status = None
     logger = None
+    # last fetch_runs body and its ETag, revalidated with If-None-Match
+    runs_etag = None
+    runs_cache = None
+    # shared by all tasks, overlaps router lookups with local work
+    _executor = ThreadPoolExecutor(max_workers=8)
 
     def __init__(self, run):
         self.project_id = run['project']
@@ -49,7 +173,12 @@ class AbstractTask(ABC):
     def method_call(self, name: str, *args, **kwargs):
         if hasattr(self, name) and callable(getattr(self, name)):
             func = getattr(self, name)
-            func(*args, **kwargs)
+            try:
+                func(*args, **kwargs)
+            finally:
+                # the handler's notifies must reach the router before the task ends:
+                # atexit doesn't run when billiard ends a prefork child with os._exit
+                flush_notifies()
         else:
             self.logger.warning("method {} not exists".format(name))
 
@@ -63,7 +192,7 @@ class AbstractTask(ABC):
         try:
             run = args[0]
             self.post_init(run)
-            s = inspect.currentframe().f_code.co_name
+            s = 'standby'
             if self.status == s:
                 self.logger.warning(
                     "Already in status {}. Ignore message".format(s))
@@ -88,13 +217,17 @@ class AbstractTask(ABC):
         In this event, input data files are validated.
         """
         try:
-            s = inspect.currentframe().f_code.co_name
+            s = 'preparing'
             if self.role == 'coordinator':
                 self.status = s
-                if self.runs_in_fails() or not self.prepare_data():
+                # look up participant runs while the local data is prepared
+                runs_future = self._executor.submit(self.fetch_runs)
+                prepared = self.prepare_data()
+                runs = runs_future.result()
+                if self.runs_in_fails(runs) or not prepared:
                     self.notify(1, param={'update_all': True})
                     return
-                if self.runs_in_same_state('preparing'):
+                if self.runs_in_same_state('preparing', runs):
                     self.notify(4, param={'update_all': True})
             else:
                 if not self.prepare_data():
@@ -118,7 +251,7 @@ class AbstractTask(ABC):
         In this event, input data files are used for training.
         """
         try:
-            s = inspect.currentframe().f_code.co_name
+            s = 'running'
             if self.status == s:
                 self.logger.warning(
                     "Already in status {}. Ignore message".format(s))
@@ -126,14 +259,18 @@ class AbstractTask(ABC):
             else:
                 self.status = s
 
-            valid = self.training()
+            if self.is_training_round():
+                valid = self.training()
+            else:
+                self.logger.info('Sync-only round, reusing mid-artifacts of the previous round')
+                valid = self.reuse_previous_mid_artifacts()
             if valid:
                 self.notify(5)
             else:
                 self.notify(1)
         except Exception as e:
             self.logger.warning("Exception in running status: {}".format(e))
-            self.logger.debug(traceback.format_exc())
+            self.logger.debug('Exception in running status', exc_info=True)
             self.notify(1)
 
     def pending_success(self, *args, **kwargs):
@@ -159,12 +296,13 @@ class AbstractTask(ABC):
         :return:
         """
         try:
-            s = inspect.currentframe().f_code.co_name
+            s = 'pending_aggregating'
             if self.role == 'coordinator':
                 self.status = s
-                if self.runs_in_fails():
+                runs = self.fetch_runs()
+                if self.runs_in_fails(runs):
                     self.notify(0, param={'update_all': True})
-                if self.runs_in_same_state('pending_aggregating') and self.download_mid_artifacts():
+                if self.runs_in_same_state('pending_aggregating', runs) and self.download_mid_artifacts(runs):
                     self.notify(7, param={'update_all': True})
             else:
                 if self.status == s:
@@ -187,7 +325,7 @@ class AbstractTask(ABC):
         :return:
         """
         try:
-            s = inspect.currentframe().f_code.co_name
+            s = 'aggregating'
             if self.role == 'coordinator':
                 self.status = s
                 if self.runs_in_fails():
@@ -213,7 +351,7 @@ class AbstractTask(ABC):
         except Exception as e:
             self.logger.warning(
                 "Exception in aggregating status: {}".format(e))
-            self.logger.debug(traceback.print_exc())
+            self.logger.debug('Exception in aggregating status', exc_info=True)
             self.notify(0, param={'update_all': True})
 
     def pending_failed(self, *args, **kwargs):
@@ -242,43 +380,59 @@ class AbstractTask(ABC):
     def training(self) -> bool:
         return True
 
-    def download_mid_artifacts(self) -> bool:
+    def download_mid_artifacts(self, runs=None) -> bool:
         """
-        :return:
+        Download the mid-artifacts of every run in the batch, one request per
+        run issued concurrently. Falls back to the router's all-runs archive
+        when the runs are unknown or any run's download fails, so aggregation
+        never pools a subset of the sites.
+        :param runs: runs of the batch, fetched here if None
+        :return: whether every run's mid-artifacts were saved
         """
         task_round = self.get_round()
         if task_round:
             self.logger.debug("Downloading mid_artifacts")
-            response = requests.get(
-                '{0}/runs-action/download/?run={1}&task_seq={2}&round_seq={3}&all_runs={4}&type=mid_artifacts'.format(
-                    router_url,
-                    self.run_id,
-                    self.cur_seq,
-                    task_round,
-                    1),
-                auth=(router_username, router_password))
-
-            if response.status_code == 404:
+            if runs is None:
+                runs = self.fetch_runs()
+            params = {'task_seq': self.cur_seq, 'round_seq': task_round, 'type': 'mid_artifacts'}
+            saved_urls = []
+            if runs:
+                requests_params = [dict(params, run=r['id'], all_runs=0) for r in runs]
+                saved_urls = list(self._executor.map(self.download_mid_artifacts_of, requests_params))
+            if not saved_urls or not all(saved_urls):
+                if saved_urls:
+                    self.logger.warning('Missing mid-artifacts of {} runs, downloading the all-runs archive'.format(
+                        saved_urls.count(None)))
+                saved_urls = [self.download_mid_artifacts_of(dict(params, run=self.run_id, all_runs=1))]
+            if not all(saved_urls):
                 self.logger.warning('No mid-artifacts found in router for project {} at batch {}'.format(
                     self.project_id, self.batch_id))
                 return False
-
-            if response.status_code == 200:
-                content = response.content
-                self.logger.debug(
-                    'Saving all mid-artifacts to local for project {} at batch {}'.format(self.project_id,
-                                                                                          self.batch_id))
-                saved_url = download_all_mid_artifacts(
-                    self.project_id, self.batch_id, content)
-                if saved_url:
-                    self.logger.debug(
-                        'Successfully download and save all mid-artifacts to local for project {} at batch {} in {} dir'.format(
-                            self.project_id, self.batch_id, saved_url))
-                    return True
-                self.logger.warning('Failed to save mid-artifacts to local for project {} at batch {}'.format(
-                    self.project_id, self.batch_id))
+            self.logger.debug(
+                'Successfully download and save {} mid-artifacts archives to local for project {} at batch {} in {} dir'.format(
+                    len(saved_urls), self.project_id, self.batch_id, saved_urls[0]))
+            return True
         return False
 
+    def download_mid_artifacts_of(self, params):
+        """
+        Download one mid-artifacts archive and extract it next to the others
+        :return: the directory saved into, None if nothing was found
+        """
+        try:
+            with get_session().get(router_cfg().download_url, params=params, stream=True,
+                                   timeout=download_timeout) as response:
+                if response.status_code != 200:
+                    self.logger.debug('No mid-artifacts of run {} ({})'.format(params['run'], response.status_code))
+                    return None
+                # read the socket directly, still undoing any Content-Encoding
+                response.raw.decode_content = True
+                return download_all_mid_artifacts(self.project_id, self.batch_id, response.raw)
+        except (requests.RequestException, ProtocolError, ReadTimeoutError) as e:
+            # a dropped or stalled transfer also fails while the archive is read
+            self.logger.warning('Failed to download mid-artifacts of run {}: {}'.format(params['run'], e))
+            return None
+
     def download_artifact(self) -> bool:
         """ Download artifact of the last run
         :return:
@@ -286,34 +440,42 @@ class AbstractTask(ABC):
         seq_no, round_no = self.get_previous_seq_and_round()
         if seq_no and round_no:
             self.logger.debug("Downloading artifact")
-            response = requests.get(
-                '{0}/runs-action/download/?run={1}&task_seq={2}&round_seq={3}&all_runs={4}&type=artifacts'.format(
-                    router_url,
-                    self.run_id,
-                    seq_no,
-                    round_no,
-                    0),
-                auth=(router_username, router_password))
-
-            if response.status_code == 404:
-                self.logger.warning('No artifacts found in router for run {} at batch {}'.format(
-                    self.project_id, self.batch_id))
-                return False
+            # an archive already extracted for this round is only revalidated
+            etag = file_utils.read_artifacts_etag(self.run_id, seq_no, round_no)
+            with get_session().get(
+                router_cfg().download_url,
+                params={'run': self.run_id, 'task_seq': seq_no, 'round_seq': round_no,
+                        'all_runs': 0, 'type': 'artifacts'},
+                headers={'If-None-Match': etag} if etag else None,
+                stream=True, timeout=download_timeout) as response:
+
+                if response.status_code == 304:
+                    self.logger.debug('Artifacts for run {} at seq {} and round {} are up to date'.format(
+                        self.run_id, seq_no, round_no))
+                    return True
 
-            if response.status_code == 200:
-                content = response.content
-                self.logger.debug(
-                    'Saving artifacts to local for run {} at seq {} and round {}'.format(self.run_id,
-                                                                                         seq_no, round_no))
-                saved_url = download_artifacts(
-                    self.run_id, seq_no, round_no, content)
-                if saved_url:
+                if response.status_code == 404:
+                    self.logger.warning('No artifacts found in router for run {} at batch {}'.format(
+                        self.project_id, self.batch_id))
+                    return False
+
+                if response.status_code == 200:
+                    # read the socket directly, still undoing any Content-Encoding
+                    response.raw.decode_content = True
                     self.logger.debug(
-                        'Successfully download and save artifacts to local for run {} at seq {} and round {} in {} dir'.format(
-                            self.run_id, seq_no, round_no, saved_url))
-                    return True
-                self.logger.warning('Failed to save mid-artifacts to local for run {} at seq {} and round {}'.format(
-                    self.run_id, seq_no, round_no))
+                        'Saving artifacts to local for run {} at seq {} and round {}'.format(self.run_id,
+                                                                                             seq_no, round_no))
+                    saved_url = download_artifacts(
+                        self.run_id, seq_no, round_no, response.raw)
+                    if saved_url:
+                        file_utils.save_artifacts_etag(
+                            self.run_id, seq_no, round_no, response.headers.get('ETag'))
+                        self.logger.debug(
+                            'Successfully download and save artifacts to local for run {} at seq {} and round {} in {} dir'.format(
+                                self.run_id, seq_no, round_no, saved_url))
+                        return True
+                    self.logger.warning('Failed to save mid-artifacts to local for run {} at seq {} and round {}'.format(
+                        self.run_id, seq_no, round_no))
         return False
 
     @abstractmethod
@@ -328,64 +490,66 @@ class AbstractTask(ABC):
         task_round = self.get_round()
         if task_round:
             self.logger.debug('will upload logs and mid-artifacts')
-            files_data = dict()
-            data = dict()
             if is_artifact:
-                artifact_url = gen_artifacts_url(
-                    self.run_id, self.cur_seq, task_round)
-                if artifact_url:
-                    files_data['artifacts'] = read_file_from_url(artifact_url)
+                file_urls = {'artifacts': gen_artifacts_url(
+                    self.run_id, self.cur_seq, task_round)}
             else:
-                mid_artifacts_url = gen_mid_artifacts_url(
-                    self.run_id, self.cur_seq, task_round)
-                logs_url = gen_logs_url(self.run_id, self.cur_seq, task_round)
-
-                if mid_artifacts_url:
-                    files_data['mid_artifacts'] = read_file_from_url(
-                        mid_artifacts_url)
-                if logs_url:
-                    files_data['logs'] = read_file_from_url(logs_url)
-
-            data['run'] = self.run_id
-            data['task_seq'] = self.cur_seq
-            data['round_seq'] = task_round
-            if any(files_data.values()):
-
-                response = requests.post('{0}/runs-action/upload/'.format(router_url, self.run_id),
-                                         auth=(router_username,
-                                               router_password),
-                                         data=data,
-                                         files=files_data)
+                file_urls = {
+                    'mid_artifacts': gen_mid_artifacts_url(self.run_id, self.cur_seq, task_round),
+                    'logs': gen_logs_url(self.run_id, self.cur_seq, task_round),
+                }
+
+            with contextlib.ExitStack() as stack:
+                fields = dict()
+                for name, url in file_urls.items():
+                    file_obj = read_file_from_url(url, 'rb')
+                    if file_obj:
+                        stack.enter_context(file_obj)
+                        fields[name] = (os.path.basename(url), file_obj, 'application/octet-stream')
+                if not fields:
+                    self.logger.debug("Files data is empty. Ignore upload")
+                    return True
+
+                fields['run'] = str(self.run_id)
+                fields['task_seq'] = str(self.cur_seq)
+                fields['round_seq'] = str(task_round)
+                # streams the files from disk instead of building the whole body in memory
+                encoder = MultipartEncoder(fields=fields)
+                response = get_session().post(router_cfg().upload_url,
+                                        data=encoder,
+                                        headers={'Content-Type': encoder.content_type},
+                                        timeout=download_timeout)
                 if response.status_code == 200:
                     self.logger.debug(
                         'Successfully upload logs and artifacts of run {} - task {} - round {}'.format(self.run_id,
                                                                                                        self.cur_seq,
                                                                                                        task_round))
                     return True
-            else:
-                self.logger.debug("Files data is empty. Ignore upload")
-                return True
 
         return False
 
     def notify(self, next_state, param: dict = None):
         if param is None:
             param = dict()
-        headers = {'Content-type': 'application/json'}
         param['status'] = next_state
-        requests.put('{0}/runs/{1}/status/'.format(router_url, self.run_id),
-                     headers=headers,
-                     auth=(router_username, router_password),
-                     data=json.dumps(param))
+        enqueue_notify(f'{router_cfg().runs_url}{self.run_id}/status/',
+                       orjson.dumps(param, option=orjson.OPT_SORT_KEYS))
 
     def fetch_runs(self):
-        runs_response = requests.get(
-            '{0}/runs/detail/?batch={1}&project={2}&site_uid={3}'.format(
-                router_url, self.batch_id, self.project_id, site_uid),
-            auth=(router_username, router_password))
+        headers = {'If-None-Match': self.runs_etag} if self.runs_etag else None
+        cfg = router_cfg()
+        runs_response = get_session().get(
+            cfg.runs_detail_url,
+            params={'batch': self.batch_id, 'project': self.project_id, 'site_uid': cfg.site_uid},
+            headers=headers,
+            timeout=fetch_runs_timeout)
+        if runs_response.status_code == 304:
+            return self.runs_cache
         if runs_response.ok:
-            dic = runs_response.json()
+            dic = orjson.loads(runs_response.content)
             runs = dic['runs']
+            self.runs_etag = runs_response.headers.get('ETag')
+            self.runs_cache = runs
             return runs
         return None
 
@@ -400,7 +564,7 @@ class AbstractTask(ABC):
         self.logger.debug(
             "Checking whether it is the last round. cur_seq: {}, total tasks: {}".format(self.cur_seq, len(self.tasks)))
         if self.cur_seq >= len(self.tasks):
-            c = self.tasks[self.cur_seq - 1]['config']
+            c = self.cur_config
             if 'total_round' in c and 'current_round' in c:
                 total_round = c['total_round']
                 current_round = c['current_round']
@@ -417,7 +581,7 @@ class AbstractTask(ABC):
             "Checking whether it is the first round. cur_seq: {}, total tasks: {}".format(self.cur_seq,
                                                                                           len(self.tasks)))
         if self.cur_seq == 1:
-            c = self.tasks[self.cur_seq - 1]['config']
+            c = self.cur_config
             if 'current_round' in c:
                 current_round = c['current_round']
                 return current_round == 1
@@ -431,7 +595,7 @@ class AbstractTask(ABC):
         Return the seq and round number of the previous round
         :return: [seq_no, round_no]
         """
-        c = self.tasks[self.cur_seq - 1]['config']
+        c = self.cur_config
         total_round = c['total_round']
         current_round = c['current_round']
 
@@ -446,48 +610,74 @@ class AbstractTask(ABC):
             else:
                 return self.cur_seq, current_round - 1
 
-    def runs_in_same_state(self, expected_state) -> bool:
+    def runs_in_same_state(self, expected_state, runs=None) -> bool:
         """
         Coordinator: Check all participants are in expected status
         :param expected_state:
+        :param runs: runs already fetched by the caller, fetched here if None
         :return:
         """
         self.logger.debug("Checking whether all runs are in the same status")
-        runs = self.fetch_runs()
+        if runs is None:
+            runs = self.fetch_runs()
         self.logger.debug("expected state: {}. All runs: {}".format(
             expected_state, runs))
         if runs:
-            for r in runs:
-                if format_status(r['status']) != expected_state:
-                    return False
-            return True
-        else:
-            return False
+            expected = run_status(expected_state)
+            return all(run_status(r['status']) == expected for r in runs)
+        return False
 
-    def runs_in_fails(self) -> bool:
-        runs = self.fetch_runs()
+    def runs_in_fails(self, runs=None) -> bool:
+        if runs is None:
+            runs = self.fetch_runs()
         if runs:
-            for r in runs:
-                if format_status(r['status']) in ['pending_failed', 'failed']:
-                    return True
+            return any(run_status(r['status']) in failed_statuses for r in runs)
         return False
 
     # This method can be used to get current round of current task
 
     def get_round(self):
-        if self.tasks and len(self.tasks) > 0:
-            cur_task = self.tasks[self.cur_seq - 1]
-            if cur_task and len(cur_task) > 0 and 'config' in cur_task:
-                return cur_task['config']['current_round']
-        return None
+        return self.cur_config.get('current_round') if self.cur_config else None
+
+    def is_training_round(self) -> bool:
+        """
+        With gamma_train and gamma_sync set in the task config, rounds cycle
+        through gamma_train training rounds followed by gamma_sync rounds that
+        only share and aggregate the previous round's result. Without them
+        every round trains, as does a round whose number is not known yet.
+        """
+        gamma_train = self.cur_config.get('gamma_train')
+        gamma_sync = self.cur_config.get('gamma_sync')
+        cur_round = self.get_round()
+        if not gamma_train or not gamma_sync or cur_round is None:
+            return True
+        return (cur_round - 1) % (gamma_train + gamma_sync) < gamma_train
+
+    def reuse_previous_mid_artifacts(self) -> bool:
+        """
+        Publish the previous round's mid-artifacts as this round's, falls back
+        to training when there is nothing to reuse
+        """
+        cur_round = self.get_round()
+        if cur_round is None:
+            return self.training()
+        previous_url = gen_mid_artifacts_url(self.run_id, self.cur_seq, cur_round - 1)
+        if not previous_url or not os.path.exists(previous_url):
+            self.logger.warning('No mid-artifacts from round {} to reuse, training instead'.format(cur_round - 1))
+            return self.training()
+        url = gen_mid_artifacts_url(self.run_id, self.cur_seq, cur_round)
+        create_if_not_exist(url)
+        # a real copy, overwriting whatever an earlier attempt of this round left
+        shutil.copyfile(previous_url, url)
+        return True
 
     def save_artifacts(self, url, content):
         if content:
             create_if_not_exist(url)
             try:
-                with open(url, 'w') as f:
-                    f.write(content)
-                    f.close()
+                if isinstance(content, str):
+                    content = content.encode()
+                Path(url).write_bytes(content)
                 return True
             except Exception as e:
                 self.logger.error(
@@ -497,6 +687,8 @@ class AbstractTask(ABC):
     def post_init(self, run):
         self.cur_seq = run['cur_seq']
         self.tasks = run['tasks']
+        cur_task = self.tasks[self.cur_seq - 1] if self.tasks else None
+        self.cur_config = (cur_task.get('config') if cur_task else None) or {}
         cur_round = self.get_round()
 
         logger_name = 'logger-{}-{}-{}'.format(
@@ -507,10 +699,22 @@ class AbstractTask(ABC):
                 'logger with name {} exists, will not init again'.format(logger_name))
             return
 
+        if self.logger:
+            # the previous round is done with its log file, release the descriptor
+            for handler in list(self.logger.handlers):
+                self.logger.removeHandler(handler)
+                handler.close()
+
+        # logging keeps loggers by name, a task rebuilt for the same round
+        # gets the existing one back and must not stack another set of handlers
+        logger = logging.getLogger(logger_name)
+        if logger.handlers:
+            self.logger = logger
+            return
+
         url = gen_logs_url(self.run_id, self.cur_seq, cur_round)
         create_if_not_exist(url)
 
-        logger = logging.getLogger(logger_name)
         logger.setLevel(logging.DEBUG)  # Set the logging level as needed
 
         # Create a log formatter
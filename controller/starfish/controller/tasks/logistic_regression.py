@@ -1,22 +1,24 @@
-import json
-from pathlib import Path
-
-import numpy
 import numpy as np
+import orjson
+from scipy.special import expit
 
 from starfish.controller.file.file_utils import gen_mid_artifacts_url, gen_all_mid_artifacts_url, gen_artifacts_url, \
-    downloaded_artifacts_url
+    iter_json_lines
 from starfish.controller.tasks.abstract_task import AbstractTask
+from starfish.controller.tasks.tabular import TabularMixin, accumulate, intercept_gram, \
+    intercept_moment, solve_normal_equations
+import sklearn
 import sklearn.linear_model
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix, roc_auc_score
+from sklearn.metrics import classification_report, roc_auc_score
+import logging
 import warnings
 
 warnings.filterwarnings('ignore')
 
 
-class LogisticRegression(AbstractTask):
+class LogisticRegression(TabularMixin, AbstractTask):
+    # features are standardized as read, like this model always has
+    coerce_features = False
 
     def __init__(self, run):
         super().__init__(run)
@@ -26,49 +28,32 @@ class LogisticRegression(AbstractTask):
         self.y_train = None
         self.X_test_scaled = None
         self.y_test = None
+        self.scaler = None
+        # the binary target, and the global [intercept, coefficients] on
+        # unscaled features
+        self.y_train_binary = None
+        self.beta = None
 
     def prepare_data(self) -> bool:
-        # load dataset
-        self.logger.debug('Loading dataset for run {} ...'.format(self.run_id))
-        X, y = self.read_dataset(self.run_id)
-        if X is not None and len(X) > 0 and y is not None and len(y) > 0:
-            self.sample_size = len(y)
-            # Split the data into training and testing sets
-            X_train, X_test, self.y_train, self.y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42)
-
-            # Standardize the numerical features
-            scaler = StandardScaler()
-            self.X_train_scaled = scaler.fit_transform(X_train)
-            self.X_test_scaled = scaler.transform(X_test)
-            self.logger.debug(
-                f'Training data shape: {self.X_train_scaled.shape}')
-            self.logger.debug(f'Training label shape: {self.y_train.shape}')
-            self.logger.debug(f'Test data shape: {self.X_test_scaled.shape}')
-            self.logger.debug(f'Test label shape: {self.y_test.shape}')
-
-            # Initialize Logistic regression model
-            self.logisticRegr = sklearn.linear_model.LogisticRegression(
-                penalty="l2",
-                max_iter=1,  # local epoch
-                warm_start=True,  # prevent refreshing weights when fitting
-            )
-            if not self.is_first_round():
-                seq_no, round_no = self.get_previous_seq_and_round()
-                directory = downloaded_artifacts_url(
-                    self.run_id, seq_no, round_no)
-                for path in Path(directory).rglob("*-{}-{}-artifacts".format(seq_no, round_no)):
-                    with open(str(path), 'r') as f:
-                        for line in f:
-                            model = json.loads(line)
-                            self.logisticRegr.coef_ = np.asarray(
-                                model['coef_'])
-                            self.logisticRegr.intercept_ = np.asarray(
-                                model['intercept_'])
-            return True
-        else:
-            self.logger.warning("Data set is not ready")
-        return False
+        # Initialize Logistic regression model, fitted by federated Newton steps
+        self.logisticRegr = sklearn.linear_model.LogisticRegression(penalty="l2")
+        return self.prepare_tabular(self.logisticRegr)
+
+    def prepare_target(self, y):
+        classes = np.unique(y)
+        if len(classes) != 2:
+            self.logger.error(f'Target variable has {len(classes)} classes. Logistic Regression requires binary target.')
+            return None
+        self.logisticRegr.classes_ = classes
+        return y
+
+    def on_training_split(self, X_train):
+        self.y_train_binary = (self.y_train == self.logisticRegr.classes_[1]).astype(float)
+
+    def load_previous_state(self, model, state):
+        super().load_previous_state(model, state)
+        if 'beta' in state:
+            self.beta = np.asarray(state['beta'])
 
     def validate(self) -> bool:
         """
@@ -83,55 +68,98 @@ class LogisticRegression(AbstractTask):
     def training(self) -> bool:
         """
         This step is used for training.
-        all parameters not specified are set to their defaults
-        default solver is incredibly slow thats why we change it
+        One Newton-Raphson (IRLS) step of the federated fit: the gradient and
+        Hessian of the local log-likelihood at the global coefficients are
+        uploaded for the coordinator to sum, and the local model takes the
+        same step on local data alone for its metrics.
         """
         self.logger.info('Starting training...')
-        self.logisticRegr.fit(self.X_train_scaled, self.y_train)
-        score = self.logisticRegr.score(self.X_test_scaled, self.y_test)
-        self.logger.info(f'Training complete. Model score: {score}')
+        if self.beta is None:
+            self.beta = np.zeros(self.X_train_scaled.shape[1] + 1)
+        gradient, hessian = self.newton_terms(self.beta)
+        self.set_raw_coefficients(self.newton_step(self.beta, gradient, hessian))
+        # the metrics share one prediction pass over the test set
         to_upload = self.calculate_statistics()
+        self.logger.info(f'Training complete. Model score: {to_upload["metric_acc"]}')
+        to_upload['beta'] = self.beta
+        to_upload['gradient'] = gradient
+        to_upload['hessian'] = hessian
         url = gen_mid_artifacts_url(
             self.run_id, self.cur_seq, self.get_round())
         self.logger.info("Upload: {} \n to: {}".format(to_upload, url))
-        return self.save_artifacts(url, json.dumps(to_upload))
+        return self.save_artifacts(url, orjson.dumps(to_upload, option=orjson.OPT_SERIALIZE_NUMPY))
+
+    def newton_terms(self, beta):
+        """
+        Gradient and negative Hessian of the local log-likelihood at beta,
+        on unscaled features so that every site's terms can be summed.
+        They're taken on the standardized features, the only copy kept, and
+        mapped back through [1, x] = [1, x_scaled] T
+        """
+        coef, intercept = self.scaled_coefficients(beta)
+        mu = expit(self.X_train_scaled @ coef + intercept)
+        gradient = intercept_moment(self.X_train_scaled, self.y_train_binary - mu)
+        hessian = intercept_gram(self.X_train_scaled, mu * (1 - mu))
+        # T = [[1, mean], [0, diag(scale)]]
+        T = np.diag(np.concatenate([[1.0], self.scaler.scale_]))
+        T[0, 1:] = self.scaler.mean_
+        return T.T @ gradient, T.T @ hessian @ T
+
+    def newton_step(self, beta, gradient, hessian):
+        # the model's l2 penalty, 1/C on every coefficient but the intercept;
+        # it also keeps the step finite on separable data
+        penalty = np.full(len(beta), 1.0 / self.logisticRegr.C)
+        penalty[0] = 0.0
+        return beta + solve_normal_equations(hessian + np.diag(penalty), gradient - penalty * beta)
+
+    def set_raw_coefficients(self, beta):
+        """
+        Load [intercept, coefficients] fitted on unscaled features into the
+        model, which predicts on this site's standardized features
+        """
+        coef, intercept = self.scaled_coefficients(beta)
+        self.logisticRegr.coef_ = coef.reshape(1, -1)
+        self.logisticRegr.intercept_ = np.array([intercept])
 
     def calculate_statistics(self):
-        y_predict = self.logisticRegr.predict(self.X_test_scaled)
+        # labels are thresholded from the probabilities, as predict() does
+        proba = self.logisticRegr.predict_proba(self.X_test_scaled)[:, 1]
+        predicted_positive = proba > 0.5
 
-        # Accuracy metric
-        accuracy = accuracy_score(self.y_test, y_predict)
-        self.logger.info(f'Accuracy: {accuracy}')
-        report = classification_report(self.y_test, y_predict)
-        self.logger.info(f'Classification report : \n  {report}')
+        if self.logger.isEnabledFor(logging.DEBUG):
+            y_predict = self.logisticRegr.classes_[predicted_positive.astype(int)]
+            self.logger.debug('Classification report : \n  %s', classification_report(self.y_test, y_predict))
 
         # Documentation: https://scikit-learn.org/stable/modules/model_evaluation.html
         # ROC-AUC
-        auc = roc_auc_score(self.y_test, y_predict)
-        self.logger.info(f'AUC: {auc}')
+        # ranked by probability: hard labels would reduce the ROC curve to one point
+        auc = roc_auc_score(self.y_test, proba)
+        self.logger.info('AUC: %s', auc)
 
-        # Use confusion matrix to calculate the metrics
-        tn, fp, fn, tp = confusion_matrix(self.y_test, y_predict).ravel()
+        # Confusion matrix in one pass: cell 2 * actual + predicted counts [tn, fp, fn, tp]
+        actual_positive = self.y_test == self.logisticRegr.classes_[1]
+        tn, fp, fn, tp = np.bincount(
+            2 * actual_positive.astype(np.int64) + predicted_positive, minlength=4)
 
         accuracy = (tp + tn) / (tn + fp + fn + tp)
-        self.logger.info(f'Accuracy: {accuracy}')
+        self.logger.info('Accuracy: %s', accuracy)
 
         sensitivity = tp / (tp + fn)
-        self.logger.info(f'Sensitivity: {sensitivity}')
+        self.logger.info('Sensitivity: %s', sensitivity)
 
         specificity = tn / (tn + fp)
-        self.logger.info(f'Specificity: {specificity}')
+        self.logger.info('Specificity: %s', specificity)
 
         npv = tn / (tn + fn)
-        self.logger.info(f'NPV: {npv}')
+        self.logger.info('NPV: %s', npv)
 
         ppv = tp / (tp + fp)
-        self.logger.info(f'PPV: {ppv}')
+        self.logger.info('PPV: %s', ppv)
 
         return {
             "sample_size": self.sample_size,
-            "coef_": self.logisticRegr.coef_.tolist(),
-            "intercept_": self.logisticRegr.intercept_.tolist(),
+            "coef_": np.ascontiguousarray(self.logisticRegr.coef_),
+            "intercept_": np.ascontiguousarray(self.logisticRegr.intercept_),
             "metric_acc": accuracy,
             "metric_auc": auc,
             "metric_sensitivity": sensitivity,
@@ -141,49 +169,57 @@ class LogisticRegression(AbstractTask):
         }
 
     def do_aggregate(self) -> bool:
-        download_mid_artifacts = []
         directory = gen_all_mid_artifacts_url(self.project_id, self.batch_id)
-        for path in Path(directory).rglob("*-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
-            with open(str(path), 'r') as f:
-                for line in f:
-                    download_mid_artifacts.append(json.loads(line))
-
-        self.logger.debug(
-            "Download mid artifacts: {}".format(download_mid_artifacts))
-
+        # one pass over the site artifacts, each folded into running sums and dropped:
+        # summed gradients and Hessians give the Newton step of the pooled fit, the
+        # sample size weighted average is the fallback when some site didn't ship them
+        n_sites = 0
         self.sample_size = 0
-        coef = None
-        intercept = None
-        for mid_artifact_dict in download_mid_artifacts:
+        gradient = None
+        hessian = None
+        site_beta = None
+        has_newton_terms = True
+        weighted_coef = None
+        weighted_intercept = None
+        for mid_artifact_dict in iter_json_lines(
+                directory, "-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
+            n_sites += 1
             sample = mid_artifact_dict['sample_size']
-            self.sample_size = self.sample_size + sample
-            weighted_coef = numpy.multiply(numpy.asarray(
-                mid_artifact_dict['coef_']), sample)
-            weighted_intercept = numpy.multiply(numpy.asarray(
-                mid_artifact_dict['intercept_']), sample)
-            if coef is None:
-                coef = weighted_coef
-            else:
-                coef = numpy.add(coef, weighted_coef)
-            if intercept is None:
-                intercept = weighted_intercept
+            self.sample_size += sample
+            weighted_coef = accumulate(weighted_coef, mid_artifact_dict['coef_'], sample)
+            weighted_intercept = accumulate(weighted_intercept, mid_artifact_dict['intercept_'], sample)
+            if has_newton_terms and 'hessian' in mid_artifact_dict:
+                gradient = accumulate(gradient, mid_artifact_dict['gradient'])
+                hessian = accumulate(hessian, mid_artifact_dict['hessian'])
+                site_beta = mid_artifact_dict['beta']
             else:
-                intercept = numpy.add(intercept, weighted_intercept)
-
-        if coef is not None and intercept is not None:
-            self.logisticRegr.coef_ = numpy.divide(coef, self.sample_size)
-            self.logisticRegr.intercept_ = numpy.divide(
-                intercept, self.sample_size)
-            to_upload = self.calculate_statistics()
-            url = gen_artifacts_url(
-                self.run_id, self.cur_seq, self.get_round())
-            self.logger.info("Upload: {} \n to: {}".format(to_upload, url))
-            if self.save_artifacts(url, json.dumps(to_upload)):
-                self.upload(True)
-                return True
-            else:
-                return False
-        else:
+                has_newton_terms = False
+
+        self.logger.debug("Aggregated mid artifacts of {} sites".format(n_sites))
+
+        if n_sites == 0:
             self.logger.warning(
                 "Not able to calculate coef and intercept due to invalid mid artifact")
             return False
+        if has_newton_terms:
+            # every site linearized at the same global coefficients
+            beta = self.beta if self.beta is not None else np.asarray(site_beta)
+            self.beta = self.newton_step(beta, gradient, hessian)
+            self.set_raw_coefficients(self.beta)
+            return self.save_aggregated_artifacts({'beta': self.beta})
+        self.logisticRegr.coef_ = weighted_coef / self.sample_size
+        self.logisticRegr.intercept_ = weighted_intercept / self.sample_size
+        return self.save_aggregated_artifacts()
+
+    def save_aggregated_artifacts(self, extra=None) -> bool:
+        to_upload = self.calculate_statistics()
+        if extra:
+            to_upload.update(extra)
+        url = gen_artifacts_url(
+            self.run_id, self.cur_seq, self.get_round())
+        self.logger.info("Upload: {} \n to: {}".format(to_upload, url))
+        if self.save_artifacts(url, orjson.dumps(to_upload, option=orjson.OPT_SERIALIZE_NUMPY)):
+            self.upload(True)
+            return True
+        else:
+            return False
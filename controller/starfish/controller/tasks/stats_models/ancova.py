@@ -17,15 +17,14 @@ Federated approach:
 """
 
 import json
-from pathlib import Path
 
 import numpy as np
 from scipy import stats as scipy_stats
+from scipy.special import ndtr
 import statsmodels.api as sm
 
 from starfish.controller.file.file_utils import (
-    gen_mid_artifacts_url, gen_all_mid_artifacts_url, gen_artifacts_url,
-    downloaded_artifacts_url
+    gen_mid_artifacts_url, gen_all_mid_artifacts_url, gen_artifacts_url, iter_files
 )
 from starfish.controller.tasks.abstract_task import AbstractTask
 from sklearn.model_selection import train_test_split
@@ -78,7 +77,7 @@ class Ancova(AbstractTask):
             )
         
         # Get config for number of group columns
-        task_config = self.tasks[self.cur_seq - 1].get('config', {})
+        task_config = self.cur_config
         self.n_group_cols = task_config.get('n_group_columns', 1)
         
         # Split data
@@ -98,16 +97,6 @@ class Ancova(AbstractTask):
         self.logger.debug(f'Training label shape: {self.y.shape}')
         self.logger.debug(f'Number of group columns: {self.n_group_cols}')
         
-        # Load previous round artifacts if not first round
-        if not self.is_first_round():
-            seq_no, round_no = self.get_previous_seq_and_round()
-            directory = downloaded_artifacts_url(self.run_id, seq_no, round_no)
-            for path in Path(directory).rglob("*-{}-{}-artifacts".format(seq_no, round_no)):
-                with open(str(path), 'r') as f:
-                    for line in f:
-                        prev_model = json.loads(line)
-                        self.logger.debug(f"Loaded previous artifacts: {prev_model.keys()}")
-        
         return True
 
     def validate(self) -> bool:
@@ -236,7 +225,7 @@ class Ancova(AbstractTask):
         download_mid_artifacts = []
         directory = gen_all_mid_artifacts_url(self.project_id, self.batch_id)
         
-        for path in Path(directory).rglob("*-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
+        for path in iter_files(directory, "-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
             with open(str(path), 'r') as f:
                 for line in f:
                     download_mid_artifacts.append(json.loads(line))
@@ -275,7 +264,7 @@ class Ancova(AbstractTask):
                 pooled_stderr = np.sqrt(1 / total_weight)
                 # Z-score and p-value
                 z = pooled_b / pooled_stderr if pooled_stderr > 0 else 0
-                p = 2 * (1 - scipy_stats.norm.cdf(abs(z)))
+                p = 2 * ndtr(-abs(z))
                 # 95% CI
                 ci_lower = pooled_b - 1.96 * pooled_stderr
                 ci_upper = pooled_b + 1.96 * pooled_stderr
@@ -306,7 +295,7 @@ class Ancova(AbstractTask):
         ms_model = total_ss_model / total_df_model if total_df_model > 0 else 0
         ms_residual = total_ss_residual / total_df_residual if total_df_residual > 0 else 1
         pooled_f = ms_model / ms_residual if ms_residual > 0 else 0
-        pooled_f_pvalue = 1 - scipy_stats.f.cdf(pooled_f, total_df_model, total_df_residual)
+        pooled_f_pvalue = scipy_stats.f.sf(pooled_f, total_df_model, total_df_residual)
         
         # Pooled R²
         pooled_r_squared = total_ss_model / total_ss_total if total_ss_total > 0 else 0
@@ -17,16 +17,15 @@ Federated approach:
 - Coordinator aggregates via inverse-variance weighted meta-analysis
 """
 
-import json
-from pathlib import Path
-
 import numpy as np
+import orjson
 from scipy import stats as scipy_stats
+from scipy.special import ndtr
 import statsmodels.api as sm
 
 from starfish.controller.file.file_utils import (
     gen_mid_artifacts_url, gen_all_mid_artifacts_url, gen_artifacts_url,
-    downloaded_artifacts_url
+    downloaded_artifacts_url, iter_json_lines
 )
 from starfish.controller.tasks.abstract_task import AbstractTask
 from sklearn.model_selection import train_test_split
@@ -57,6 +56,8 @@ class LogisticRegressionStats(AbstractTask):
         self.y = None
         self.X_with_const = None
         self.model_result = None
+        # previous round's pooled coefficients, the start of this round's fit
+        self.prev_coef = None
 
     def prepare_data(self) -> bool:
         self.logger.debug('Loading dataset for run {} ...'.format(self.run_id))
@@ -101,11 +102,10 @@ class LogisticRegressionStats(AbstractTask):
         if not self.is_first_round():
             seq_no, round_no = self.get_previous_seq_and_round()
             directory = downloaded_artifacts_url(self.run_id, seq_no, round_no)
-            for path in Path(directory).rglob("*-{}-{}-artifacts".format(seq_no, round_no)):
-                with open(str(path), 'r') as f:
-                    for line in f:
-                        prev_model = json.loads(line)
-                        self.logger.debug(f"Loaded previous artifacts: {prev_model.keys()}")
+            for prev_model in iter_json_lines(directory, "-{}-{}-artifacts".format(seq_no, round_no)):
+                self.logger.debug(f"Loaded previous artifacts: {prev_model.keys()}")
+                if 'coef_' in prev_model:
+                    self.prev_coef = np.asarray(prev_model['coef_'], dtype=float)
         
         return True
 
@@ -128,8 +128,15 @@ class LogisticRegressionStats(AbstractTask):
             # Fit Logit model
             model = sm.Logit(self.y, self.X_with_const)
             
+            # Newton-Raphson from the previous round's estimate when it fits this design,
+            # usually a few steps from convergence instead of a start from zero
+            start_params = self.prev_coef
+            if start_params is not None and (start_params.shape != (self.X_with_const.shape[1],)
+                                             or not np.isfinite(start_params).all()):
+                start_params = None
+
             # Use disp=0 to suppress convergence output
-            self.model_result = model.fit(disp=0)
+            self.model_result = model.fit(disp=0, method='newton', start_params=start_params)
             
             self.logger.info(f'Model fitted. Pseudo R² = {self.model_result.prsquared:.4f}')
             
@@ -139,7 +146,7 @@ class LogisticRegressionStats(AbstractTask):
             url = gen_mid_artifacts_url(self.run_id, self.cur_seq, self.get_round())
             self.logger.info(f"Saving mid-artifacts to: {url}")
             
-            return self.save_artifacts(url, json.dumps(stats))
+            return self.save_artifacts(url, orjson.dumps(stats, option=orjson.OPT_SERIALIZE_NUMPY))
             
         except Exception as e:
             self.logger.error(f'Error during Logistic Regression training: {e}')
@@ -151,15 +158,15 @@ class LogisticRegressionStats(AbstractTask):
         """
         result = self.model_result
         
-        # Basic coefficients and inference
-        coef = result.params.tolist()
-        std_err = result.bse.tolist()
-        z_values = result.tvalues.tolist() # In statsmodels Logit, tvalues are z-scores
-        p_values = result.pvalues.tolist()
-        conf_int = result.conf_int().tolist()
+        # Basic coefficients and inference, kept as arrays for orjson
+        coef = np.asarray(result.params)
+        std_err = np.asarray(result.bse)
+        z_values = np.asarray(result.tvalues) # In statsmodels Logit, tvalues are z-scores
+        p_values = np.asarray(result.pvalues)
+        conf_int = np.asarray(result.conf_int())
         
         # Odds Ratios (OR)
-        odds_ratios = np.exp(coef).tolist()   # It's the coefficient transformed from the log-odds scale back to an understandable odds scale ($e^{\beta}$).
+        odds_ratios = np.exp(coef)   # It's the coefficient transformed from the log-odds scale back to an understandable odds scale ($e^{\beta}$).
         
         # Model fit statistics
         prsquared = result.prsquared # McFadden's Pseudo R-squared
@@ -183,8 +190,8 @@ class LogisticRegressionStats(AbstractTask):
             "std_err": std_err,
             "z_values": z_values,
             "p_values": p_values,
-            "conf_int_lower": [ci[0] for ci in conf_int],
-            "conf_int_upper": [ci[1] for ci in conf_int],
+            "conf_int_lower": np.ascontiguousarray(conf_int[:, 0]),
+            "conf_int_upper": np.ascontiguousarray(conf_int[:, 1]),
             "odds_ratios": odds_ratios,
             "prsquared": prsquared,
             "llr": llr,
@@ -197,79 +204,58 @@ class LogisticRegressionStats(AbstractTask):
         """
         Aggregate Logistic Regression results from all sites using inverse-variance weighted meta-analysis.
         """
-        download_mid_artifacts = []
         directory = gen_all_mid_artifacts_url(self.project_id, self.batch_id)
-        
-        for path in Path(directory).rglob("*-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
-            with open(str(path), 'r') as f:
-                for line in f:
-                    download_mid_artifacts.append(json.loads(line))
 
-        self.logger.debug(f"Downloaded {len(download_mid_artifacts)} mid-artifacts")
+        # One pass over the site artifacts, each folded into running sums and dropped.
+        # A null standard error (NaN written by orjson) becomes NaN and gets no weight
+        n_sites = 0
+        total_sample_size = 0
+        sum_coef = 0.0
+        sum_weighted_coef = 0.0
+        total_weight = 0.0
+        sum_weighted_prsquared = 0.0
+        # Summing Log-Likelihoods is valid if we assume independence between sites
+        total_llf = 0.0
+        total_llnull = 0.0
+        for a in iter_json_lines(directory, "-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
+            coefs = np.asarray(a['coef_'], dtype=float)
+            std_errs = np.asarray(a['std_err'], dtype=float)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                weights = np.where(std_errs > 0, 1.0 / (std_errs * std_errs), 0.0)
+            n_sites += 1
+            total_sample_size += a['sample_size']
+            sum_coef = sum_coef + coefs
+            sum_weighted_coef = sum_weighted_coef + coefs * weights
+            total_weight = total_weight + weights
+            sum_weighted_prsquared += a['prsquared'] * a['sample_size']
+            total_llf += a['llf']
+            total_llnull += a['llnull']
+
+        self.logger.debug(f"Downloaded {n_sites} mid-artifacts")
         
-        if len(download_mid_artifacts) == 0:
+        if n_sites == 0:
             self.logger.warning("No mid-artifacts found for aggregation")
             return False
 
-        # Inverse-variance weighted meta-analysis
-        n_coef = len(download_mid_artifacts[0]['coef_'])
-        
-        pooled_coef = []
-        pooled_se = []
-        pooled_z = []
-        pooled_pvalues = []
-        pooled_ci_lower = []
-        pooled_ci_upper = []
-        
-        total_sample_size = sum(a['sample_size'] for a in download_mid_artifacts)
-        
-        # Pool each coefficient separately
-        for i in range(n_coef):
-            coefs = [a['coef_'][i] for a in download_mid_artifacts]
-            std_errs = [a['std_err'][i] for a in download_mid_artifacts]
-            
-            # Inverse variance weights
-            weights = [1 / (se ** 2) if se > 0 else 0 for se in std_errs]
-            total_weight = sum(weights)
-            
-            if total_weight > 0:
-                # Pooled coefficient
-                pooled_b = sum(c * w for c, w in zip(coefs, weights)) / total_weight
-                # Pooled standard error
-                pooled_stderr = np.sqrt(1 / total_weight)
-                # Z-score and p-value
-                z = pooled_b / pooled_stderr if pooled_stderr > 0 else 0
-                p = 2 * (1 - scipy_stats.norm.cdf(abs(z)))
-                # 95% CI
-                ci_lower = pooled_b - 1.96 * pooled_stderr
-                ci_upper = pooled_b + 1.96 * pooled_stderr
-            else:
-                pooled_b = np.mean(coefs)
-                pooled_stderr = 0
-                z = 0
-                p = 1.0
-                ci_lower = pooled_b
-                ci_upper = pooled_b
-            
-            pooled_coef.append(pooled_b)
-            pooled_se.append(pooled_stderr)
-            pooled_z.append(z)
-            pooled_pvalues.append(p)
-            pooled_ci_lower.append(ci_lower)
-            pooled_ci_upper.append(ci_upper)
+        # Inverse-variance weighted meta-analysis, all coefficients at once
+        n_coef = len(total_weight)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weighted = total_weight > 0
+            # coefficients no site could weight fall back to the plain mean
+            pooled_coef = np.where(weighted, sum_weighted_coef / total_weight, sum_coef / n_sites)
+            pooled_se = np.where(weighted, np.sqrt(1.0 / total_weight), 0.0)
+            pooled_z = np.where(weighted, pooled_coef / pooled_se, 0.0)
+        # two-sided p-value from the normal tail, ndtr(-|z|) = 1 - cdf(|z|)
+        pooled_pvalues = 2 * ndtr(-np.abs(pooled_z))
+        pooled_ci_lower = pooled_coef - 1.96 * pooled_se
+        pooled_ci_upper = pooled_coef + 1.96 * pooled_se
 
         # Calculate pooled Odds Ratios
-        pooled_odds_ratios = np.exp(pooled_coef).tolist()
+        pooled_odds_ratios = np.exp(pooled_coef)
 
         # Pool Model Fit Statistics
         # For Pseudo R2 and LLR, we can weight by sample size as an approximation
-        pooled_prsquared = sum(
-            a['prsquared'] * a['sample_size'] for a in download_mid_artifacts
-        ) / total_sample_size if total_sample_size > 0 else 0
-        
-        # Summing Log-Likelihoods is valid if we assume independence between sites
-        total_llf = sum(a['llf'] for a in download_mid_artifacts)
-        total_llnull = sum(a['llnull'] for a in download_mid_artifacts)
+        pooled_prsquared = sum_weighted_prsquared / total_sample_size if total_sample_size > 0 else 0
         
         # Recalculate LLR based on summed log-likelihoods
         # LLR = -2 * (llnull - llf)
@@ -290,7 +276,7 @@ class LogisticRegressionStats(AbstractTask):
 
         aggregated_stats = {
             "total_sample_size": total_sample_size,
-            "n_sites": len(download_mid_artifacts),
+            "n_sites": n_sites,
             "coef_": pooled_coef,
             "std_err": pooled_se,
             "z_values": pooled_z,
@@ -308,7 +294,7 @@ class LogisticRegressionStats(AbstractTask):
         url = gen_artifacts_url(self.run_id, self.cur_seq, self.get_round())
         self.logger.info(f"Saving aggregated artifacts to: {url}")
         
-        if self.save_artifacts(url, json.dumps(aggregated_stats)):
+        if self.save_artifacts(url, orjson.dumps(aggregated_stats, option=orjson.OPT_SERIALIZE_NUMPY)):
             self.upload(True)
             return True
         
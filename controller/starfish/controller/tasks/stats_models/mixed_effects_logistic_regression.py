@@ -32,17 +32,15 @@ uncertainty quantification.
 """
 
 import json
-from pathlib import Path
 
 import numpy as np
 import pandas as pd
-from scipy import stats as scipy_stats
+from scipy.special import ndtr
 from scipy import sparse
 from statsmodels.genmod.bayes_mixed_glm import BinomialBayesMixedGLM
 
 from starfish.controller.file.file_utils import (
-    gen_mid_artifacts_url, gen_all_mid_artifacts_url, gen_artifacts_url,
-    downloaded_artifacts_url
+    gen_mid_artifacts_url, gen_all_mid_artifacts_url, gen_artifacts_url, iter_files
 )
 from starfish.controller.tasks.abstract_task import AbstractTask
 from sklearn.model_selection import train_test_split
@@ -128,7 +126,7 @@ class MixedEffectsLogisticRegression(AbstractTask):
             )
         
         # Get config parameters
-        task_config = self.tasks[self.cur_seq - 1].get('config', {})
+        task_config = self.cur_config
         self.vcp_p = task_config.get('vcp_p', 1.0)
         self.fe_p = task_config.get('fe_p', 2.0)
         
@@ -230,16 +228,6 @@ class MixedEffectsLogisticRegression(AbstractTask):
         self.logger.debug(f'Number of predictors: {self.X.shape[1]}')
         self.logger.debug(f'Groups in training: {len(np.unique(self.groups))}')
         
-        # Load previous round artifacts if not first round
-        if not self.is_first_round():
-            seq_no, round_no = self.get_previous_seq_and_round()
-            directory = downloaded_artifacts_url(self.run_id, seq_no, round_no)
-            for path in Path(directory).rglob("*-{}-{}-artifacts".format(seq_no, round_no)):
-                with open(str(path), 'r') as f:
-                    for line in f:
-                        prev_model = json.loads(line)
-                        self.logger.debug(f"Loaded previous artifacts: {prev_model.keys()}")
-        
         return True
 
     def validate(self) -> bool:
@@ -384,7 +372,7 @@ class MixedEffectsLogisticRegression(AbstractTask):
             fe_z_values.append(z)
             
             # Two-tailed p-value
-            p = 2 * (1 - scipy_stats.norm.cdf(abs(z)))
+            p = 2 * ndtr(-abs(z))
             fe_p_values.append(p)
             
             # 95% CI (using normal approximation)
@@ -495,7 +483,7 @@ class MixedEffectsLogisticRegression(AbstractTask):
         download_mid_artifacts = []
         directory = gen_all_mid_artifacts_url(self.project_id, self.batch_id)
         
-        for path in Path(directory).rglob("*-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
+        for path in iter_files(directory, "-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
             with open(str(path), 'r') as f:
                 for line in f:
                     download_mid_artifacts.append(json.loads(line))
@@ -17,26 +17,87 @@ Model assumptions:
 - No multicollinearity among predictors
 """
 
-import json
-from pathlib import Path
+import functools
 
 import numpy as np
-from scipy import stats as scipy_stats
-from statsmodels.miscmodels.ordinal_model import OrderedModel
+import orjson
+from scipy.special import chdtrc, ndtr, ndtri
 
 from starfish.controller.file.file_utils import (
     gen_mid_artifacts_url, gen_all_mid_artifacts_url, gen_artifacts_url,
-    downloaded_artifacts_url
+    downloaded_artifacts_url, iter_files, iter_json_lines
 )
 from starfish.controller.tasks.abstract_task import AbstractTask
 from sklearn.model_selection import train_test_split
 import warnings
 
-warnings.filterwarnings('ignore')
-
 MIN_SAMPLE_SIZE = 30
 MIN_CATEGORIES = 3
 
+# statistics are serialized straight from numpy; category_counts has integer keys
+ARTIFACT_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def category_codes(y):
+    """
+    Categories of an integer-coded target, each row's index among them and
+    the number of rows in each.
+    Non-negative codes no larger than the row count, the usual 0..K-1 coding,
+    are counted in one bincount pass; anything else goes through np.unique's sort.
+    :return: (categories, codes, counts)
+    """
+    if y.size and y.min() >= 0 and y.max() <= y.size:
+        all_counts = np.bincount(y)
+        categories = np.flatnonzero(all_counts)
+        if len(categories) == len(all_counts):
+            # already consecutive from 0, the rows are their own codes
+            return categories, y, all_counts
+        return categories, (np.cumsum(all_counts > 0) - 1)[y], all_counts[categories]
+    categories, codes, counts = np.unique(y, return_inverse=True, return_counts=True)
+    return categories, codes.reshape(-1), counts
+
+
+@functools.lru_cache(maxsize=None)
+def ordered_logit():
+    """
+    The OrderedLogit model class, defined on first use: statsmodels takes
+    about a second to import, which workers that never run this task skip.
+    """
+    from statsmodels.miscmodels.ordinal_model import OrderedModel
+    from statsmodels.tools.numdiff import approx_fprime
+
+    class OrderedLogit(OrderedModel):
+        """
+        OrderedModel with the analytic score of its log-likelihood.
+        statsmodels differentiates the log-likelihood numerically, two full passes
+        over the data per parameter for every gradient; this takes one pass.
+        """
+
+        def score(self, params):
+            low, upp = self._bounds(params)
+            # same floor as loglikeobs, so this is exactly its derivative
+            prob = self.prob(low, upp) + 1e-20
+            pdf_low = self.pdf(low) / prob
+            pdf_upp = self.pdf(upp) / prob
+            n_thresholds = self.k_levels - 1
+            # d loglike / d threshold_j, from the observations whose interval it bounds
+            d_thresh = (np.bincount(self.endog, weights=pdf_upp, minlength=self.k_levels)[:n_thresholds]
+                        - np.bincount(self.endog, weights=pdf_low, minlength=self.k_levels)[1:])
+            # thresholds are the cumulative sum of [first, exp(increments)]: threshold_j
+            # depends on every parameter up to j, by the exponentiated increment
+            th_params = params[-n_thresholds:]
+            d_th_params = d_thresh[::-1].cumsum()[::-1] * np.concatenate(([1.0], np.exp(th_params[1:])))
+            d_coef = self.exog.T @ (pdf_low - pdf_upp)
+            return np.concatenate((d_coef, d_th_params))
+
+        def hessian(self, params):
+            # differentiating the analytic score takes O(k) log-likelihood passes
+            # where differentiating the log-likelihood twice takes O(k²)
+            hess = approx_fprime(params, self.score, centered=True)
+            return (hess + hess.T) / 2
+
+    return OrderedLogit
+
 
 class OrdinalLogisticRegression(AbstractTask):
     """
@@ -67,6 +128,11 @@ class OrdinalLogisticRegression(AbstractTask):
         self.X_test = None
         self.y_test = None
         self.model_result = None
+        # [coefficients, thresholds] of the previous round, in OrderedModel's parameterization
+        self.prev_params = None
+        # the predictors are standardized for the fit, results are reported unscaled
+        self.X_mean = None
+        self.X_scale = None
 
     def prepare_data(self) -> bool:
         self.logger.debug('Loading dataset for run {} ...'.format(self.run_id))
@@ -100,8 +166,9 @@ class OrdinalLogisticRegression(AbstractTask):
                 )
                 return False
         
-        # Get unique categories and validate
-        unique_categories = np.unique(y_array)
+        # Get unique categories and validate; the codes are the categories
+        # remapped to 0..K-1, the counts their distribution
+        unique_categories, codes, counts = category_codes(y_array)
         self.n_categories = len(unique_categories)
         
         # Check minimum categories
@@ -122,14 +189,11 @@ class OrdinalLogisticRegression(AbstractTask):
                 f"Remapping categories..."
             )
             # Remap to consecutive integers
-            category_map = {old: new for new, old in enumerate(unique_categories)}
-            y_array = np.array([category_map[val] for val in y_array])
+            y_array = codes
         
         # Count observations per category
-        self.category_counts = {}
-        for cat in range(self.n_categories):
-            count = np.sum(y_array == cat)
-            self.category_counts[cat] = int(count)
+        self.category_counts = {cat: int(count) for cat, count in enumerate(counts)}
+        for cat, count in self.category_counts.items():
             if count < 5:
                 self.logger.warning(
                     f"Category {cat} has only {count} observations. "
@@ -139,6 +203,13 @@ class OrdinalLogisticRegression(AbstractTask):
         self.logger.info(f"Number of ordinal categories: {self.n_categories}")
         self.logger.info(f"Category distribution: {self.category_counts}")
         
+        try:
+            # float64 once here, before the split copies the rows
+            X = np.asarray(X, dtype=np.float64)
+        except (ValueError, TypeError):
+            self.logger.error('Predictors must be numeric, dummy-encode categorical ones before upload')
+            return False
+
         # Split data
         X_train, X_test, y_train, y_test = train_test_split(
             X, y_array, test_size=0.2, random_state=42, stratify=y_array
@@ -153,15 +224,13 @@ class OrdinalLogisticRegression(AbstractTask):
         self.logger.debug(f'Training label shape: {self.y.shape}')
         self.logger.debug(f'Test data shape: {self.X_test.shape}')
         
-        # Load previous round artifacts if not first round
         if not self.is_first_round():
             seq_no, round_no = self.get_previous_seq_and_round()
             directory = downloaded_artifacts_url(self.run_id, seq_no, round_no)
-            for path in Path(directory).rglob("*-{}-{}-artifacts".format(seq_no, round_no)):
-                with open(str(path), 'r') as f:
-                    for line in f:
-                        prev_model = json.loads(line)
-                        self.logger.debug(f"Loaded previous artifacts: {prev_model.keys()}")
+            for prev_model in iter_json_lines(directory, "-{}-{}-artifacts".format(seq_no, round_no)):
+                self.logger.debug(f"Loaded previous artifacts: {prev_model.keys()}")
+                if 'coef_' in prev_model and 'thresholds' in prev_model:
+                    self.prev_params = np.asarray(prev_model['coef_'] + prev_model['thresholds'], dtype=float)
         
         return True
 
@@ -177,18 +246,55 @@ class OrdinalLogisticRegression(AbstractTask):
     def training(self) -> bool:
         """
         Fit Ordinal Logistic Regression model and compute statistics.
+
+        The likelihood is maximized with L-BFGS-B, which keeps a few recent
+        gradient pairs instead of BFGS's dense inverse Hessian: O(p·m) rather
+        than O(p²) memory and work per iteration for p parameters, which pays
+        off once there are more than a few dozen predictors. BFGS is only run
+        when L-BFGS-B doesn't converge, warm started from where it stopped.
+        Later rounds start from the previous round's estimate.
+        Gradients and the Hessian behind the standard errors come from
+        OrderedLogit's analytic score.
+        The predictors are standardized for the fit: on predictors of very
+        different scales the Hessian is badly conditioned, and L-BFGS-B can
+        take hundreds of iterations where it takes ten on standardized ones.
         """
         self.logger.info('Starting Ordinal Logistic Regression (Proportional Odds Model) analysis...')
         self.logger.info(f'Number of categories: {self.n_categories}')
         self.logger.info(f'Number of predictors: {self.X.shape[1]}')
         
         try:
-            # Fit Ordered Logit model using statsmodels
-            # distr='logit' specifies the proportional odds (cumulative logit) model
-            model = OrderedModel(self.y, self.X, distr='logit')
-            
-            # Fit with MLE, disp=0 suppresses convergence output
-            self.model_result = model.fit(method='bfgs', disp=0)
+            # Convergence is checked and logged below, and the optimizer's overflow
+            # warnings on extreme steps are expected; both are silenced for the fit only
+            from statsmodels.tools.sm_exceptions import ConvergenceWarning
+
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', ConvergenceWarning)
+                warnings.simplefilter('ignore', RuntimeWarning)
+
+                self.X_mean = self.X.mean(axis=0)
+                self.X_scale = self.X.std(axis=0)
+                self.X_scale[self.X_scale == 0] = 1.0
+
+                # Fit Ordered Logit model using statsmodels
+                # distr='logit' specifies the proportional odds (cumulative logit) model
+                model = ordered_logit()(self.y, (self.X - self.X_mean) / self.X_scale, distr='logit')
+
+                # Start from the previous round's estimate when it fits this design,
+                # usually a few iterations from convergence instead of a start from zero
+                start_params = self.prev_params
+                if start_params is not None and (start_params.shape != (model.k_vars + model.k_levels - 1,)
+                                                 or not np.isfinite(start_params).all()):
+                    start_params = None
+                if start_params is not None:
+                    start_params = self.scale_params(start_params)
+
+                # Fit with MLE, disp=0 suppresses convergence output
+                self.model_result = model.fit(method='lbfgs', disp=0, maxiter=200, start_params=start_params)
+                if not self.model_result.mle_retvals.get('converged', True):
+                    self.logger.warning('L-BFGS-B did not converge, refitting with BFGS')
+                    self.model_result = model.fit(
+                        method='bfgs', disp=0, start_params=self.model_result.params)
             
             self.logger.info(f'Model fitted successfully.')
             self.logger.info(f'Pseudo R² (McFadden) = {self.model_result.prsquared:.4f}')
@@ -199,7 +305,7 @@ class OrdinalLogisticRegression(AbstractTask):
             url = gen_mid_artifacts_url(self.run_id, self.cur_seq, self.get_round())
             self.logger.info(f"Saving mid-artifacts to: {url}")
             
-            return self.save_artifacts(url, json.dumps(stats))
+            return self.save_artifacts(url, orjson.dumps(stats, option=ARTIFACT_OPTIONS))
             
         except np.linalg.LinAlgError as e:
             self.logger.error(
@@ -223,16 +329,17 @@ class OrdinalLogisticRegression(AbstractTask):
         """
         result = self.model_result
         
-        # Get number of predictors and thresholds
+        # Get number of predictors
         n_predictors = self.X.shape[1]
-        n_thresholds = self.n_categories - 1
         
-        # Extract all parameters
-        all_params = result.params.tolist()
-        all_std_err = result.bse.tolist()
-        all_z_values = result.tvalues.tolist()  # z-scores for MLE
-        all_p_values = result.pvalues.tolist()
-        all_conf_int = result.conf_int().tolist()
+        # Extract all parameters on the unscaled predictors, kept as arrays for orjson;
+        # inference is the same Wald inference statsmodels reports, for MLE on the normal
+        all_params, cov = self.unscaled_params(np.asarray(result.params), np.asarray(result.cov_params()))
+        all_std_err = np.sqrt(np.diag(cov))
+        all_z_values = all_params / all_std_err  # z-scores for MLE
+        all_p_values = 2 * ndtr(-np.abs(all_z_values))
+        margin = ndtri(0.975) * all_std_err
+        all_conf_int = np.column_stack((all_params - margin, all_params + margin))
         
         # Split into coefficients and thresholds
         # In statsmodels OrderedModel: first n_predictors are betas, last n_thresholds are cut-points
@@ -240,20 +347,20 @@ class OrdinalLogisticRegression(AbstractTask):
         coef_std_err = all_std_err[:n_predictors]
         coef_z_values = all_z_values[:n_predictors]
         coef_p_values = all_p_values[:n_predictors]
-        coef_conf_int_lower = [ci[0] for ci in all_conf_int[:n_predictors]]
-        coef_conf_int_upper = [ci[1] for ci in all_conf_int[:n_predictors]]
+        coef_conf_int_lower = np.ascontiguousarray(all_conf_int[:n_predictors, 0])
+        coef_conf_int_upper = np.ascontiguousarray(all_conf_int[:n_predictors, 1])
         
         thresholds = all_params[n_predictors:]
         threshold_std_err = all_std_err[n_predictors:]
         threshold_z_values = all_z_values[n_predictors:]
         threshold_p_values = all_p_values[n_predictors:]
-        threshold_conf_int_lower = [ci[0] for ci in all_conf_int[n_predictors:]]
-        threshold_conf_int_upper = [ci[1] for ci in all_conf_int[n_predictors:]]
+        threshold_conf_int_lower = np.ascontiguousarray(all_conf_int[n_predictors:, 0])
+        threshold_conf_int_upper = np.ascontiguousarray(all_conf_int[n_predictors:, 1])
         
         # Calculate Odds Ratios for coefficients (exp(beta))
-        odds_ratios = np.exp(coef).tolist()
-        odds_ratio_ci_lower = np.exp(coef_conf_int_lower).tolist()
-        odds_ratio_ci_upper = np.exp(coef_conf_int_upper).tolist()
+        odds_ratios = np.exp(coef)
+        odds_ratio_ci_lower = np.exp(coef_conf_int_lower)
+        odds_ratio_ci_upper = np.exp(coef_conf_int_upper)
         
         # Model fit statistics
         prsquared = result.prsquared  # McFadden's Pseudo R-squared
@@ -264,7 +371,7 @@ class OrdinalLogisticRegression(AbstractTask):
         llr = -2 * (llnull - llf)
         # Degrees of freedom = number of predictors
         llr_df = n_predictors
-        llr_pvalue = scipy_stats.chi2.sf(llr, llr_df)
+        llr_pvalue = chdtrc(llr_df, llr)
         
         # AIC and BIC for model comparison
         aic = result.aic
@@ -320,34 +427,63 @@ class OrdinalLogisticRegression(AbstractTask):
             "bic": bic
         }
 
+    def unscaled_params(self, params, cov):
+        """
+        Map [coefficients, thresholds] fitted on the standardized predictors,
+        and their covariance, back to the original predictors.
+        x_scaled b = x (b / scale) - mean·(b / scale), so the coefficients are
+        divided by the scale and the first threshold, the others being its
+        increments, moves by mean·coef
+        """
+        n_predictors = len(self.X_scale)
+        transform = np.eye(len(params))
+        transform[:n_predictors, :n_predictors] = np.diag(1.0 / self.X_scale)
+        transform[n_predictors, :n_predictors] = self.X_mean / self.X_scale
+        return transform @ params, transform @ cov @ transform.T
+
+    def scale_params(self, params):
+        """Inverse of unscaled_params for the parameters alone"""
+        n_predictors = len(self.X_scale)
+        scaled = params.copy()
+        scaled[:n_predictors] = params[:n_predictors] * self.X_scale
+        scaled[n_predictors] = params[n_predictors] - self.X_mean @ params[:n_predictors]
+        return scaled
+
     def do_aggregate(self) -> bool:
         """
         For centralized version: Simply collect the single site's results and save as final artifacts.
         No aggregation across multiple sites is performed.
         """
-        download_mid_artifacts = []
         directory = gen_all_mid_artifacts_url(self.project_id, self.batch_id)
         
-        for path in Path(directory).rglob("*-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
-            with open(str(path), 'r') as f:
-                for line in f:
-                    download_mid_artifacts.append(json.loads(line))
+        # Only the first site's results are used, so only the first line of its
+        # file is read; every site uploads one file, the others are only counted
+        # for the warning below
+        site_stats = None
+        n_mid_artifacts = 0
+        for path in iter_files(directory, "-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
+            if site_stats is None:
+                with open(str(path), 'rb') as f:
+                    line = f.readline()
+                if not line.strip():
+                    continue
+                site_stats = orjson.loads(line)
+            n_mid_artifacts += 1
 
-        self.logger.debug(f"Downloaded {len(download_mid_artifacts)} mid-artifacts")
+        self.logger.debug(f"Downloaded {n_mid_artifacts} mid-artifacts")
         
-        if len(download_mid_artifacts) == 0:
+        if site_stats is None:
             self.logger.warning("No mid-artifacts found")
             return False
         
-        if len(download_mid_artifacts) > 1:
+        if n_mid_artifacts > 1:
             self.logger.warning(
-                f"Found {len(download_mid_artifacts)} site results. "
+                f"Found {n_mid_artifacts} site results. "
                 "Ordinal Logistic Regression is configured for centralized (single-site) analysis. "
                 "Using the first site's results only."
             )
         
         # For centralized analysis, use the single site's results directly
-        site_stats = download_mid_artifacts[0]
         
         # Add metadata to indicate this is a centralized analysis
         final_stats = {
@@ -368,7 +504,7 @@ class OrdinalLogisticRegression(AbstractTask):
         url = gen_artifacts_url(self.run_id, self.cur_seq, self.get_round())
         self.logger.info(f"Saving final artifacts to: {url}")
         
-        if self.save_artifacts(url, json.dumps(final_stats)):
+        if self.save_artifacts(url, orjson.dumps(final_stats, option=ARTIFACT_OPTIONS)):
             self.upload(True)
             return True
         
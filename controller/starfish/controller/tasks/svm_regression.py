@@ -1,11 +1,10 @@
 import json
-from pathlib import Path
 
 import numpy
 import numpy as np
 
 from starfish.controller.file.file_utils import gen_mid_artifacts_url, gen_all_mid_artifacts_url, gen_artifacts_url, \
-    downloaded_artifacts_url
+    downloaded_artifacts_url, iter_files
 from starfish.controller.tasks.abstract_task import AbstractTask
 import sklearn.svm
 from sklearn.model_selection import train_test_split
@@ -58,7 +57,7 @@ class SvmRegression(AbstractTask):   # Also called Support Vector Regression (SV
                 seq_no, round_no = self.get_previous_seq_and_round()
                 directory = downloaded_artifacts_url(
                     self.run_id, seq_no, round_no)
-                for path in Path(directory).rglob("*-{}-{}-artifacts".format(seq_no, round_no)):
+                for path in iter_files(directory, "-{}-{}-artifacts".format(seq_no, round_no)):
                     with open(str(path), 'r') as f:
                         for line in f:
                             model = json.loads(line)
@@ -127,7 +126,7 @@ class SvmRegression(AbstractTask):   # Also called Support Vector Regression (SV
     def do_aggregate(self) -> bool:
         download_mid_artifacts = []
         directory = gen_all_mid_artifacts_url(self.project_id, self.batch_id)
-        for path in Path(directory).rglob("*-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
+        for path in iter_files(directory, "-{}-{}-mid-artifacts".format(self.cur_seq, self.get_round())):
             with open(str(path), 'r') as f:
                 for line in f:
                     download_mid_artifacts.append(json.loads(line))
@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from starfish.controller.file.file_utils import downloaded_artifacts_url, iter_json_lines
+
+
+def solve_normal_equations(xtx, xty):
+    """
+    Solve (XᵀX) β = Xᵀy, falling back to least squares when XᵀX is singular
+    (e.g. a constant feature duplicating the intercept column)
+    """
+    try:
+        return np.linalg.solve(xtx, xty)
+    except np.linalg.LinAlgError:
+        return np.linalg.lstsq(xtx, xty, rcond=None)[0]
+
+
+def accumulate(total, values, scale=1):
+    """
+    Add scale * values into the running total in place and return it; the
+    first values, e.g. a parsed JSON list, start the total as a float array
+    """
+    values = np.multiply(values, scale) if scale != 1 else values
+    if total is None:
+        # a scalar starts a 0-d array, which still adds in place
+        return np.array(values, dtype=float)
+    total += values
+    return total
+
+
+def intercept_gram(X, weight=None):
+    """
+    [1, X]ᵀ diag(weight) [1, X] by blocks, without materializing the
+    intercept-augmented copy of X
+    """
+    XtW = X.T if weight is None else X.T * weight
+    gram = np.empty((X.shape[1] + 1, X.shape[1] + 1))
+    gram[0, 0] = len(X) if weight is None else weight.sum()
+    gram[0, 1:] = gram[1:, 0] = XtW.sum(axis=1)
+    gram[1:, 1:] = XtW @ X
+    return gram
+
+
+def intercept_moment(X, v):
+    """[1, X]ᵀ v, without materializing the intercept-augmented copy of X"""
+    return np.concatenate([[v.sum()], X.T @ v])
+
+
+class TabularMixin:
+    """
+    Data preparation shared by the sklearn regression tasks: load the
+    dataset, coerce the features to float, split and standardize it, and
+    seed the model with the previous round's artifacts.
+    Mixed in ahead of AbstractTask, so it's never picked up as a model itself.
+    """
+    # drop the non-numeric feature columns and reject missing or infinite
+    # values before the split; when off, the features go to the scaler as read
+    coerce_features = True
+
+    def prepare_tabular(self, model) -> bool:
+        """
+        :param model: unfitted estimator, seeded in place when not the first round
+        :return: whether the data set is ready
+        """
+        self.logger.debug('Loading dataset for run {} ...'.format(self.run_id))
+        X, y = self.read_dataset(self.run_id)
+        if X is None or len(X) == 0 or y is None or len(y) == 0:
+            self.logger.warning("Data set is not ready")
+            return False
+        self.sample_size = len(y)
+
+        # NOTE: We expect the data to be pre-processed before upload:
+        # - One-hot encoding should be done before splitting the dataset
+        # - Use preprocess_dataset.py script to create site1 and site2 CSV files
+        # - The script can also be modified to split the dataset into more than two csv files
+        # - This ensures all sites have identical feature sets (same columns)
+        X = np.asarray(X)
+        if self.coerce_features:
+            if X.dtype.kind in 'biuf':
+                # already numeric: no DataFrame round-trip needed
+                X = X.astype(float, copy=False)
+            else:
+                try:
+                    # numbers and numeric strings convert in one C-level pass
+                    X = X.astype(float)
+                except (TypeError, ValueError):
+                    # text columns present, coerce column by column and drop them
+                    X = self.numeric_features(X)
+            # checked once here, so the estimators' per-call scans can be skipped
+            if not np.isfinite(X).all():
+                self.logger.error('Features contain missing or infinite values, impute them before upload')
+                return False
+
+        y = self.prepare_target(y)
+        if y is None:
+            return False
+
+        # Split the data into training and testing sets
+        X_train, X_test, self.y_train, self.y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42)
+        self.on_training_split(X_train)
+
+        # Standardize the numerical features
+        # train_test_split already copied the rows, so scale them in place;
+        # the result stays C-contiguous float64, the layout sklearn validates to
+        self.scaler = StandardScaler(copy=False)
+        self.X_train_scaled = self.scaler.fit_transform(X_train)
+        self.X_test_scaled = self.scaler.transform(X_test)
+        self.logger.debug(f'Training data shape: {self.X_train_scaled.shape}')
+        self.logger.debug(f'Training label shape: {self.y_train.shape}')
+        self.logger.debug(f'Test data shape: {self.X_test_scaled.shape}')
+        self.logger.debug(f'Test label shape: {self.y_test.shape}')
+
+        if not self.is_first_round():
+            seq_no, round_no = self.get_previous_seq_and_round()
+            directory = downloaded_artifacts_url(self.run_id, seq_no, round_no)
+            for state in iter_json_lines(directory, "-{}-{}-artifacts".format(seq_no, round_no)):
+                self.load_previous_state(model, state)
+        return True
+
+    def load_previous_state(self, model, state):
+        """
+        Hook to seed the model from one record of the previous round's artifacts
+        """
+        model.coef_ = np.asarray(state['coef_'])
+        model.intercept_ = np.asarray(state['intercept_'])
+
+    def scaled_coefficients(self, beta):
+        """
+        Map [intercept, coefficients] fitted on unscaled features into this
+        site's standardized feature space
+        :return: (coef, intercept)
+        """
+        return beta[1:] * self.scaler.scale_, float(beta[0] + self.scaler.mean_ @ beta[1:])
+
+    def prepare_target(self, y):
+        """
+        Hook to validate or convert the target before the split
+        :return: the target, None to reject the data set
+        """
+        return y
+
+    def on_training_split(self, X_train):
+        """
+        Hook to see the unscaled training features before they're
+        standardized in place
+        """
+
+    def numeric_features(self, X):
+        """
+        Coerce mixed-type features to float in one pass, dropping the
+        columns that aren't numeric so every site keeps the same features
+        """
+        X_df = pd.DataFrame(X)
+        self.logger.debug(f'Original data shape: {X_df.shape}')
+        self.logger.debug(f'Data types before conversion: {X_df.dtypes.value_counts().to_dict()}')
+
+        coerced = X_df.apply(pd.to_numeric, errors='coerce')
+        # a column is categorical if coercion lost any of its values;
+        # all-empty columns carry nothing either
+        categorical = (coerced.isna() & X_df.notna()).any() | coerced.isna().all()
+        if categorical.any():
+            # For federated learning, drop categorical columns to ensure consistency across sites
+            self.logger.warning(f'Dropping {int(categorical.sum())} categorical columns for federated consistency')
+            coerced = coerced.loc[:, ~categorical]
+            self.logger.debug(f'After dropping categorical columns shape: {coerced.shape}')
+        return coerced.to_numpy(dtype=float)
@@ -1,4 +1,4 @@
-import arrow
+from datetime import datetime
 
 from django import template
 
@@ -10,8 +10,23 @@ status_dic = {"FAILED": 0, "PENDING FAILED": 1, "STANDBY": 2, "PREPARING": 3, "R
               "SUCCESS": 6}
 download_actions = ['download artifacts',
                     'download logs', 'download mid_artifacts']
+# file type each download action fetches, e.g. 'download logs' -> 'logs'
+download_file_types = {action: action.split()[1] for action in download_actions}
 restart = 'restart'
 stop = 'stop'
+# actions offered per run status, by status code:
+# success can be restarted or downloaded, pending success waits, standby can only be
+# stopped, preparing and running stopped or restarted, failures restarted
+actions_by_code = {
+    6: (restart, *download_actions),
+    5: (),
+    4: (stop, restart),
+    3: (stop, restart),
+    2: (stop,),
+    1: (restart,),
+    0: (restart,),
+}
+actions_by_status = {status: actions_by_code[code] for status, code in status_dic.items()}
 
 
 @register.filter
@@ -51,8 +66,9 @@ def site_duration(site):
 def get_time_diff(update_at_str, create_at_str):
     if not update_at_str or not create_at_str:
         return 0
-    update_at = arrow.get(update_at_str[:-1])
-    create_at = arrow.get(create_at_str[:-1])
+    # the router's ISO 8601 UTC timestamps, parsed in C without the trailing Z
+    update_at = datetime.fromisoformat(update_at_str[:-1])
+    create_at = datetime.fromisoformat(create_at_str[:-1])
     if not update_at or not create_at:
         return 0
     return update_at - create_at
@@ -60,26 +76,9 @@ def get_time_diff(update_at_str, create_at_str):
 
 @register.filter
 def get_actions(status: str):
-    actions = []
     if not status:
-        return actions
-    status = status.upper()
-    if status not in status_dic:
-        return actions
-    code = status_dic[status]
-    if code == 6:
-        actions.append(restart)
-        actions.extend(download_actions)
-        return actions
-    if code == 5:
-        return actions
-    if code >= 2:
-        actions.append(stop)
-        if code > 2:
-            actions.append(restart)
-        return actions
-    actions.append(restart)
-    return actions
+        return ()
+    return actions_by_status.get(status.upper(), ())
 
 
 @register.filter
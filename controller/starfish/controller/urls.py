@@ -1,19 +1,28 @@
-from django.urls import path
+from django.urls import include, path
 
 from . import views
 
-urlpatterns = [
-    path('', views.index, name="index"),
-    path("projects/<int:project_id>/<int:site_id>/", views.project_detail),
-    path("projects/new/", views.project_new),
-    path("projects/join/", views.project_join),
-    path("projects/leave/", views.project_leave),
-    path("runs/<int:run_id>/", views.run_detail),
-    path("runs/detail/<int:batch>/<int:project_id>/<int:site_id>/", views.run_detail),
-    path("runs/start/<int:project_id>/<int:site_id>/", views.start_runs),
-    path("runs/dataset/", views.upload_dataset),
-    path("runs/action/<int:run_id>/<int:project_id>/<int:batch>/<str:role>/<str:action>/",
+# grouped by prefix, so a request is only matched against its own group
+project_patterns = [
+    path("<int:project_id>/<int:site_id>/", views.project_detail),
+    path("new/", views.project_new),
+    path("join/", views.project_join),
+    path("leave/", views.project_leave),
+]
+
+run_patterns = [
+    path("<int:run_id>/", views.run_detail),
+    path("detail/<int:batch>/<int:project_id>/<int:site_id>/", views.run_detail),
+    path("start/<int:project_id>/<int:site_id>/", views.start_runs),
+    path("dataset/", views.upload_dataset),
+    path("action/<int:run_id>/<int:project_id>/<int:batch>/<str:role>/<str:action>/",
          views.perform_run_action),
-    path("runs/fetch_logs/",
+    path("fetch_logs/",
          views.fetch_logs),
 ]
+
+urlpatterns = [
+    path('', views.index, name="index"),
+    path("projects/", include(project_patterns)),
+    path("runs/", include(run_patterns)),
+]
@@ -1,6 +1,8 @@
+import functools
 import json
 import re
 import time
+from enum import IntEnum
 from importlib import import_module
 
 
@@ -14,8 +16,13 @@ def load_class(module_name, class_name):
     return klass
 
 
+camel_case_boundary = re.compile('(?!^)([A-Z]+)')
+
+
+@functools.lru_cache(maxsize=64)
 def camel_to_snake(name):
-    return re.sub('(?!^)([A-Z]+)', r'_\1', name).lower()
+    # task names come from a small fixed set of model classes
+    return camel_case_boundary.sub(r'_\1', name).lower()
 
 
 def parse_tasks(tasks_str):
@@ -34,3 +41,33 @@ def format_status(status):
     :return: status with underscore
     """
     return status.replace(" ", "_").lower() if status else None
+
+
+class RunStatus(IntEnum):
+    """
+    Run status codes, same values as the router's Run.RunStatus
+    """
+    FAILED = 0
+    PENDING_FAILED = 1
+    STANDBY = 2
+    PREPARING = 3
+    RUNNING = 4
+    PENDING_SUCCESS = 5
+    PENDING_AGGREGATING = 6
+    AGGREGATING = 7
+    SUCCESS = 8
+
+
+failed_statuses = frozenset([RunStatus.PENDING_FAILED, RunStatus.FAILED])
+
+
+@functools.lru_cache(maxsize=64)
+def run_status(status):
+    """
+    Example: Pending Aggregating -> RunStatus.PENDING_AGGREGATING
+    :param status: status label or formatted status
+    :return: RunStatus member, None if unknown
+    """
+    if not status:
+        return None
+    return RunStatus.__members__.get(status.replace(" ", "_").upper())
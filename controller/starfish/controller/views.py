@@ -1,10 +1,15 @@
-import base64
-import json
+import functools
+import io
+import itertools
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
+import orjson
 import requests
-from django.core.files.storage import FileSystemStorage
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.http import FileResponse
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
 from django.http import JsonResponse
@@ -12,10 +17,10 @@ from django.shortcuts import redirect
 from django.template import loader
 from dotenv import load_dotenv
 
-from .file.file_utils import gen_logs_url, gen_dataset_url
+from .file.file_utils import download_chunk_size, gen_logs_url, save_dataset
 from .forms import SiteForm, ProjectJoinForm, ProjectNewForm, ProjectLeaveForm
 from .tasks_validator import TaskValidator
-from .templatetags.fl_tag import download_actions
+from .templatetags.fl_tag import download_file_types
 
 # take environment variables from .env.
 load_dotenv()
@@ -27,6 +32,66 @@ router_url = os.getenv('ROUTER_URL')
 router_username = os.getenv('ROUTER_USERNAME')
 router_password = os.getenv('ROUTER_PASSWORD')
 
+# Keep-alive session shared by every view, so a page's router calls reuse
+# pooled connections instead of a handshake each
+router_session = requests.Session()
+router_session.auth = (router_username, router_password)
+router_session.headers.update({'Content-Type': 'application/json'})
+# gateway errors and dropped connections are retried briefly; the last
+# response is still returned, for the views to report
+router_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32,
+                             max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504],
+                                               raise_on_status=False))
+router_session.mount('http://', router_adapter)
+router_session.mount('https://', router_adapter)
+# (connect, read) timeout, so a hung router can't hold a worker indefinitely
+router_timeout = (3.05, 30)
+
+# router endpoints, built once: router_url and site_uid are fixed after import
+sites_url = f"{router_url}/sites/"
+site_url = f"{router_url}/sites/{{}}/"
+site_lookup_url = f"{router_url}/sites/lookup/?uid={site_uid}"
+projects_url = f"{router_url}/projects/"
+project_url = f"{router_url}/projects/{{}}/"
+projects_by_site_url = f"{router_url}/projects/lookup/?site_id={{}}"
+projects_by_name_url = f"{router_url}/projects/lookup/?name={{}}"
+participants_url = f"{router_url}/project-participants/"
+participant_url = f"{router_url}/project-participants/{{}}/"
+participants_by_project_url = f"{router_url}/project-participants/lookup/?project={{}}"
+runs_url = f"{router_url}/runs"
+runs_by_project_url = f"{router_url}/runs/lookup/?project={{}}&site_uid={site_uid}"
+run_detail_url = f"{router_url}/runs/detail/?batch={{}}&project={{}}&site={{}}"
+run_status_url = f"{router_url}/runs/{{}}/status/"
+run_download_url = f"{router_url}/runs-action/download/?run={{}}&all_runs=1&type={{}}"
+run_action_url = f"{router_url}/runs-action/update/"
+
+# overlaps a view's independent router lookups
+router_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def _dumps(data):
+    """JSON body of a request to the router, as bytes"""
+    return orjson.dumps(data)
+
+
+def _loads(response):
+    """JSON body of a router response"""
+    return orjson.loads(response.content)
+
+
+@functools.lru_cache(maxsize=1)
+def current_site_id():
+    """
+    Router id of this site, looked up once and cleared when index registers or
+    deregisters the site. Raises LookupError while it can't be found, so a
+    miss isn't cached.
+    """
+    response = router_session.get(site_lookup_url, timeout=router_timeout)
+    current_site = _loads(response) if response.ok else None
+    if not current_site:
+        raise LookupError(site_uid)
+    return current_site['id']
+
 
 # Create your views here.
 def index(request):
@@ -39,26 +104,24 @@ def index(request):
             site_name = site_form.cleaned_data['name']
             site_description = site_form.cleaned_data['description']
             # get current site info
-            response = requests.get('{0}/sites/lookup/?uid={1}'.format(router_url, site_uid),
-                                    auth=(router_username, router_password))
+            response = router_session.get(site_lookup_url, timeout=router_timeout)
             current_site = None
             if response.ok:
-                current_site = response.json()
+                current_site = _loads(response)
 
+            # the site's id changes with registration, look it up again next time
+            current_site_id.cache_clear()
             if current_site:
                 # site already exists
                 if 'deregister_site' in request.POST:
                     # delete site with DELETE
-                    requests.delete('{0}/sites/{1}/'.format(router_url, current_site['id']),
-                                    auth=(router_username, router_password))
+                    router_session.delete(site_url.format(current_site['id']), timeout=router_timeout)
                 else:
                     # update site with PUT
                     current_site['name'] = site_name
                     current_site['description'] = site_description
-                    requests.put('{0}/sites/{1}/'.format(router_url, current_site['id']),
-                                 headers={'Content-Type': 'application/json'},
-                                 auth=(router_username, router_password),
-                                 data=json.dumps(current_site))
+                    router_session.put(site_url.format(current_site['id']),
+                                       data=_dumps(current_site), timeout=router_timeout)
             else:
                 # site does not exist, create site with POST
                 current_site = dict()
@@ -66,20 +129,17 @@ def index(request):
                 current_site['name'] = site_name
                 current_site['description'] = site_description
                 # register new site
-                requests.post('{0}/sites/'.format(router_url),
-                              headers={'Content-Type': 'application/json'},
-                              auth=(router_username, router_password),
-                              data=json.dumps(current_site))
+                router_session.post(sites_url,
+                                    data=_dumps(current_site), timeout=router_timeout)
         # redirect to the same page
         return HttpResponseRedirect("./")
     # if a GET, load the form
     else:
-        response = requests.get('{0}/sites/lookup/?uid={1}'.format(router_url, site_uid),
-                                auth=(router_username, router_password))
+        response = router_session.get(site_lookup_url, timeout=router_timeout)
         # if current site exists, store it for use
         current_site = None
         if response.ok:
-            current_site = response.json()
+            current_site = _loads(response)
 
         project_participants = None
 
@@ -90,10 +150,9 @@ def index(request):
                 'description': current_site['description'],
             })
             # get all projects this site is involved
-            response_project_participants = requests \
-                .get('{0}/projects/lookup/?site_id={1}'.format(router_url, current_site['id']),
-                     auth=(router_username, router_password))
-            project_participants = response_project_participants.json()
+            response_project_participants = router_session \
+                .get(projects_by_site_url.format(current_site['id']), timeout=router_timeout)
+            project_participants = _loads(response_project_participants)
         else:
             # site does not exist, init blank form
             site_form = SiteForm()
@@ -122,13 +181,14 @@ def project_leave(request):
         # create a form instance and populate it with data from the request:
         project_leave_form = ProjectLeaveForm(request.POST)
         # check if form is valid:
-        print(project_leave_form)
         if project_leave_form.is_valid():
             pp_id = project_leave_form.cleaned_data['participant_id']
             # get current site info
-            rr = requests.delete('{0}/project-participants/{1}/'.format(router_url, pp_id),
-                                 auth=(router_username, router_password))
-            print(rr)
+            rr = router_session.delete(participant_url.format(pp_id), timeout=router_timeout)
+            # lazy arguments: the response is only rendered when debug logging is on
+            logger.debug('Leave project participant %s: %s', pp_id, rr)
+        else:
+            logger.debug('Invalid project leave form: %s', project_leave_form.errors)
     return redirect('index')
 
 
@@ -149,35 +209,31 @@ def project_new(request):
                     {'success': False,
                      'msg': 'Tasks provided is not valid due to {}'.format(validator.get_error_msg())})
             # get current site info
-            response = requests.get('{0}/sites/lookup/?uid={1}'.format(router_url, site_uid),
-                                    auth=(router_username, router_password))
-            current_site = None
-            if response.ok:
-                current_site = response.json()
-            else:
+            try:
+                site_id = current_site_id()
+            except LookupError:
                 return JsonResponse(
                     {'success': False,
                      'msg': 'Failed to get current site information with site id {}'.format(site_uid)})
 
-            if current_site:
-                # create new Project
-                project = dict()
-                project['name'] = project_name
-                project['description'] = description
-                project['site'] = current_site['id']
-                project['tasks'] = task_list
-                requests.post('{0}/projects/'.format(router_url),
-                              headers={'Content-Type': 'application/json'},
-                              auth=(router_username, router_password),
-                              data=json.dumps(project))
-                if response.ok:
-                    return JsonResponse(
-                        {'success': True,
-                         'msg': 'Successfully create new project with name {}'.format(project_name)})
-                else:
-                    return JsonResponse(
-                        {'success': False,
-                         'msg': 'Failed to create new project due to {}'.format(response.text)})
+            # create new Project
+            project = dict()
+            project['name'] = project_name
+            project['description'] = description
+            project['site'] = site_id
+            project['tasks'] = task_list
+            response = router_session.post(projects_url,
+                                           data=_dumps(project), timeout=router_timeout)
+            if response.ok:
+                return JsonResponse(
+                    {'success': True,
+                     'msg': 'Successfully create new project with name {}'.format(project_name)})
+            else:
+                # the site may have been re-registered elsewhere, don't keep its old id
+                current_site_id.cache_clear()
+                return JsonResponse(
+                    {'success': False,
+                     'msg': 'Failed to create new project due to {}'.format(response.text)})
 
         # redirect to the home page
         return JsonResponse(
@@ -204,17 +260,19 @@ def project_join(request):
         if project_join_form.is_valid():
             project_name = project_join_form.cleaned_data['name']
             notes = project_join_form.cleaned_data['notes']
-            response = requests.get('{0}/projects/lookup/?name={1}'.format(router_url, project_name),
-                                    auth=(router_username, router_password))
+            # the project and the site info don't depend on each other
+            project_future = router_executor.submit(
+                router_session.get, projects_by_name_url.format(project_name), timeout=router_timeout)
+            site_future = router_executor.submit(router_session.get, site_lookup_url, timeout=router_timeout)
+            response = project_future.result()
             project_to_join = None
             if response.ok:
-                project_to_join = response.json()
+                project_to_join = _loads(response)
             # retrieve site info
-            response = requests.get('{0}/sites/lookup/?uid={1}'.format(router_url, site_uid),
-                                    auth=(router_username, router_password))
+            response = site_future.result()
             current_site = None
             if response.ok:
-                current_site = response.json()
+                current_site = _loads(response)
             if project_to_join:
                 # create new ProjectParticipant to join the project
                 project_participant = dict()
@@ -222,10 +280,8 @@ def project_join(request):
                 project_participant['project'] = project_to_join['id']
                 project_participant['role'] = 'PA'
                 project_participant['notes'] = notes
-                requests.post('{0}/project-participants/'.format(router_url),
-                              headers={'Content-Type': 'application/json'},
-                              auth=(router_username, router_password),
-                              data=json.dumps(project_participant))
+                router_session.post(participants_url,
+                                    data=_dumps(project_participant), timeout=router_timeout)
         # redirect to the home page
         return HttpResponseRedirect("/controller/")
     # if a GET, load the form
@@ -243,27 +299,26 @@ def project_join(request):
 
 
 def project_detail(request, project_id, site_id):
-    project_response = requests.get('{0}/projects/{1}/'.format(router_url, project_id),
-                                    auth=(router_username, router_password))
+    # the runs lookup doesn't depend on the project, fetch it meanwhile
+    runs_future = router_executor.submit(router_session.get, runs_by_project_url.format(project_id),
+                                         timeout=router_timeout)
+    project_response = router_session.get(project_url.format(project_id), timeout=router_timeout)
     current_project = None
     all_participants = None
     all_runs = None
     can_start_runs = False
     if project_response.ok:
-        current_project = project_response.json()
+        current_project = _loads(project_response)
         if site_id == current_project["site"]:
-            participants_response = requests.get(
-                '{0}/project-participants/lookup/?project={1}'.format(
-                    router_url, project_id),
-                auth=(router_username, router_password))
+            participants_response = router_session.get(participants_by_project_url.format(project_id),
+                                                       timeout=router_timeout)
             if participants_response.ok:
-                all_participants = participants_response.json()
+                all_participants = _loads(participants_response)
                 can_start_runs = True
 
-    runs_response = requests.get('{0}/runs/lookup/?project={1}&site_uid={2}'.format(router_url, project_id, site_uid),
-                                 auth=(router_username, router_password))
+    runs_response = runs_future.result()
     if runs_response.ok:
-        all_runs = runs_response.json()
+        all_runs = _loads(runs_response)
     
     # Check if there are any active runs (not Completed or Failed)
     has_active_runs = False
@@ -297,14 +352,12 @@ def project_detail(request, project_id, site_id):
 
 
 def run_detail(request, batch, project_id, site_id):
-    runs_response = requests.get(
-        '{0}/runs/detail/?batch={1}&project={2}&site={3}'.format(
-            router_url, batch, project_id, site_id),
-        auth=(router_username, router_password))
+    runs_response = router_session.get(run_detail_url.format(batch, project_id, site_id),
+                                       timeout=router_timeout)
     # if current site exists, store it for use
     dic = {}
     if runs_response.ok:
-        dic = runs_response.json()
+        dic = _loads(runs_response)
     # run participants
     # render template
     template = loader.get_template(
@@ -329,25 +382,18 @@ def upload_dataset(request):
             'success': False, 'msg': 'Dataset is not provided to perform action'
         })
     if dataset:
-        url = gen_dataset_url(run_id)
         try:
-            fs = FileSystemStorage(url)
-            name = fs.save('dataset', dataset)
-            if not name:
-                return JsonResponse({
-                    'success': False, 'msg': 'Dataset saving error'
-                })
-        except:
+            save_dataset(run_id, dataset)
+        except OSError:
+            logger.exception('Failed to save dataset of run {}'.format(run_id))
             return JsonResponse({
                 'success': False, 'msg': 'Dataset saving error'
             })
 
     param = dict()
     param['status'] = 3
-    requests.put('{0}/runs/{1}/status/'.format(router_url, run_id),
-                 headers={'Content-type': 'application/json'},
-                 auth=(router_username, router_password),
-                 data=json.dumps(param))
+    router_session.put(run_status_url.format(run_id),
+                       data=_dumps(param), timeout=router_timeout)
 
     return JsonResponse({
         'success': True, 'msg': 'Dataset save successfully'
@@ -358,10 +404,8 @@ def start_runs(request, project_id, site_id):
     if project_id and site_id:
         data = dict()
         data['project'] = project_id
-        response = requests.post('{0}/runs'.format(router_url),
-                                 headers={'Content-Type': 'application/json'},
-                                 auth=(router_username, router_password),
-                                 data=json.dumps(data))
+        response = router_session.post(runs_url,
+                                       data=_dumps(data), timeout=router_timeout)
         if not response.ok:
             return JsonResponse(
                 {'success': False, 'msg': 'Failed to start runs of new round due to {}'.format(response.text)})
@@ -375,16 +419,12 @@ def start_runs(request, project_id, site_id):
 
 def perform_run_action(request, run_id, project_id, batch, role, action):
     if run_id and project_id and batch and role and action:
-        file_type = None
-        if action in download_actions:
-            file_type = action.split()[1]
+        # None unless the action is a download
+        file_type = download_file_types.get(action)
+        if file_type:
             logger.debug('will download {} files'.format(file_type))
-            response = requests.get(
-                '{0}/runs-action/download/?run={1}&all_runs={2}&type={3}'.format(router_url,
-                                                                                 run_id,
-                                                                                 1,
-                                                                                 file_type),
-                auth=(router_username, router_password))
+            response = router_session.get(run_download_url.format(run_id, file_type),
+                                          stream=True, timeout=router_timeout)
         else:
             data = dict()
             data['run'] = run_id
@@ -392,21 +432,22 @@ def perform_run_action(request, run_id, project_id, batch, role, action):
             data['batch'] = batch
             data['role'] = role
             data['action'] = action
-            response = requests.put('{0}/runs-action/update/'.format(router_url),
-                                    headers={
-                                        'Content-Type': 'application/json'},
-                                    auth=(router_username, router_password),
-                                    data=json.dumps(data))
+            response = router_session.put(run_action_url,
+                                          data=_dumps(data), timeout=router_timeout)
         if not response.ok:
             return JsonResponse(
                 {'success': False,
                  'msg': 'Failed to perform {} action on run with id : {} due to {}'.format(action, run_id,
                                                                                            response.text)})
         else:
-            if action in download_actions:
-                return JsonResponse(
-                    {'success': True, 'msg': 'Successfully get run artifacts or logs', 'file_type': file_type,
-                     'content': base64.b64encode(response.content).decode('utf-8')})
+            if file_type:
+                # relay the archive as it arrives, rather than buffering it
+                # into a base64 string inside the JSON reply
+                response.raw.decode_content = True
+                file_response = FileResponse(response.raw, content_type='application/zip',
+                                             as_attachment=True, filename='{}.zip'.format(file_type))
+                file_response.block_size = download_chunk_size
+                return file_response
             return JsonResponse({'success': True, 'msg': 'Successfully update run status'})
     else:
         return JsonResponse(
@@ -417,21 +458,31 @@ def fetch_logs(request):
     run_id = request.GET.get('run_id')
     task_seq = request.GET.get('task_seq')
     round_seq = request.GET.get('round_seq')
-    line = int(request.GET.get('line'))
+    offset = request.GET.get('offset')
     logs_url = gen_logs_url(run_id, task_seq, round_seq)
     try:
-        # with open(logs_url, 'r') as log_file:
-        with open(logs_url, 'r') as file:
-            lines = file.readlines()
-
-            # Calculate the index for the start line
-            start_index = max(line, 0)
-
-            # Extract the lines from the start index
-            selected_lines = lines[start_index:]
-
-            # Return the selected lines as a list
+        if offset is None:
+            # line based polls skip the lines already sent without holding the file
+            start_index = max(int(request.GET.get('line')), 0)
+            with open(logs_url, 'r') as file:
+                selected_lines = list(itertools.islice(file, start_index, None))
             return JsonResponse({'success': True, 'content': selected_lines})
+
+        # read only the bytes appended since the client's last poll
+        offset = max(int(offset), 0)
+        size = os.stat(logs_url).st_size
+        if offset >= size:
+            # most polls of an idle run find nothing new, answer without opening the log
+            return JsonResponse({'success': True, 'content': [], 'offset': offset})
+        with open(logs_url, 'rb') as file:
+            file.seek(offset)
+            new = file.read(size - offset)
+        # a line still being written is sent whole with the next poll
+        end = new.rfind(b'\n') + 1
+        text = new[:end].decode('utf-8', 'replace')
+        return JsonResponse({'success': True,
+                             'content': io.StringIO(text, newline=None).readlines(),
+                             'offset': offset + end})
     except FileNotFoundError:
         msg = "No logs yet"
 
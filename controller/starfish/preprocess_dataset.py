@@ -11,9 +11,49 @@ Usage:
 """
 
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 
+try:
+    import pyarrow
+    import pyarrow.csv
+    csv_engine = 'pyarrow'
+except ImportError:  # optional speed-up, fall back to the pandas C parser and writer
+    pyarrow = None
+    csv_engine = 'c'
+
+
+def convert_numeric_columns(df):
+    """
+    Convert the text columns whose values are all numbers to numeric types.
+    read_csv already parsed the numeric columns, so only text columns are
+    tried, in one vectorized pass.
+    """
+    text_cols = df.select_dtypes(include=['object']).columns
+    if len(text_cols) == 0:
+        return df
+    text = df[text_cols]
+    converted = text.apply(pd.to_numeric, errors='coerce')
+    # a column converts only if coercion lost none of its values
+    numeric = (converted.notna() | text.isna()).all()
+    df[numeric.index[numeric]] = converted.loc[:, numeric]
+    return df
+
+
+def write_site_csv(data, output_file):
+    """
+    Save one site's rows without headers (Starfish reads with header=None),
+    with Arrow's C++ writer when pyarrow is installed
+    """
+    if pyarrow is None:
+        data.to_csv(output_file, index=False, header=False)
+        return
+    table = pyarrow.Table.from_pandas(data, preserve_index=False)
+    pyarrow.csv.write_csv(table, output_file,
+                          write_options=pyarrow.csv.WriteOptions(include_header=False))
+
 
 def preprocess_and_split(input_file, output_site1, output_site2):
     """
@@ -28,19 +68,27 @@ def preprocess_and_split(input_file, output_site1, output_site2):
     """
     print(f"Loading data from {input_file}...")
     # Read CSV
-    df = pd.read_csv(input_file)
+    # Arrow's reader parses in parallel, with numpy dtypes so the steps below are unchanged
+    df = pd.read_csv(input_file, engine=csv_engine)
     
     print(f"Dataset shape: {df.shape}")
     print(f"Column names: {list(df.columns)}")
     
     # Step 1: Convert string numbers to actual numeric types
     print("\nConverting numeric columns...")
-    for col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors='ignore')
+    df = convert_numeric_columns(df)
     
-    # Step 2: Identify categorical vs numeric columns
-    categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
-    numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    # Step 2: Identify categorical vs numeric columns, in one pass over the dtypes
+    categorical_cols = []
+    numeric_cols = []
+    bool_cols = []
+    for col, dtype in df.dtypes.items():
+        if pd.api.types.is_string_dtype(dtype):
+            categorical_cols.append(col)
+        elif dtype.kind in 'iufc':
+            numeric_cols.append(col)
+        elif dtype.kind == 'b':
+            bool_cols.append(col)
     
     print(f"\nCategorical columns ({len(categorical_cols)}): {categorical_cols}")
     print(f"Numeric columns ({len(numeric_cols)}): {numeric_cols}")
@@ -56,11 +104,11 @@ def preprocess_and_split(input_file, output_site1, output_site2):
     # Step 3: One-hot encode categorical columns
     if categorical_cols:
         print(f"\nOne-hot encoding {len(categorical_cols)} categorical columns...")
-        df_encoded = pd.get_dummies(df, columns=categorical_cols, drop_first=False)
+        # uint8 indicators are written as 0 and 1 directly, at 1 byte per cell
+        df_encoded = pd.get_dummies(df, columns=categorical_cols, drop_first=False, dtype=np.uint8)
         
-        # Convert boolean columns to integers (0 and 1) for compatibility
-        bool_cols = df_encoded.select_dtypes(include=['bool']).columns
-        if len(bool_cols) > 0:
+        # Convert the input's boolean columns to integers (0 and 1) for compatibility
+        if bool_cols:
             print(f"Converting {len(bool_cols)} boolean columns to integers...")
             df_encoded[bool_cols] = df_encoded[bool_cols].astype(int)
         
@@ -78,20 +126,24 @@ def preprocess_and_split(input_file, output_site1, output_site2):
         print("\nNo categorical columns to encode")
     
     # Step 4: Split the data
-    # Shuffle for random distribution
-    df_shuffled = df_encoded.sample(frac=1, random_state=42).reset_index(drop=True)
+    # Shuffle for random distribution: the same permutation sample(frac=1, random_state=42)
+    # draws, applied to each half as it's written so no full shuffled copy is held
+    shuffled_rows = np.random.RandomState(42).permutation(len(df_encoded))
     
-    split_point = len(df_shuffled) // 2
-    site1_data = df_shuffled.iloc[:split_point]
-    site2_data = df_shuffled.iloc[split_point:]
+    split_point = len(shuffled_rows) // 2
+    site1_rows = shuffled_rows[:split_point]
+    site2_rows = shuffled_rows[split_point:]
     
     print(f"\nSplitting data:")
-    print(f"  Site 1: {len(site1_data)} rows")
-    print(f"  Site 2: {len(site2_data)} rows")
+    print(f"  Site 1: {len(site1_rows)} rows")
+    print(f"  Site 2: {len(site2_rows)} rows")
     
-    # Step 5: Save the files without headers (Starfish reads with header=None)
-    site1_data.to_csv(output_site1, index=False, header=False)
-    site2_data.to_csv(output_site2, index=False, header=False)
+    # Step 5: Save the files without headers, both sites at once
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        writes = [executor.submit(write_site_csv, df_encoded.take(rows), output_file)
+                  for rows, output_file in ((site1_rows, output_site1), (site2_rows, output_site2))]
+        for write in writes:
+            write.result()
     
     print(f"\nSuccessfully created:")
     print(f"   {output_site1}")
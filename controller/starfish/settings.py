@@ -98,22 +98,19 @@ REDIS_DB = os.getenv('REDIS_DB', default=0)
 
 CELERY_TASK_ROUTES = {
     'heartbeat': {'queue': 'starfish.run'},
+    'poll_run': {'queue': 'starfish.run'},
     'fetch_run': {'queue': 'starfish.run'},
     'monitor_run': {'queue': 'starfish.run'},
     'process_task': {'queue': 'starfish.processor'}
 }
 
 CELERY_BEAT_SCHEDULE = {
-    'fetch_run': {
-        'task': 'fetch_run',
+    # one router poll feeds both the status-change and the retry checks
+    'poll_run': {
+        'task': 'poll_run',
         'schedule': 5,
         'options': {'queue': 'starfish.run'}
     },
-    'monitor_run': {
-        'task': 'monitor_run',
-        'schedule': 10,
-        'options': {'queue': 'starfish.run'}
-    },
     'heartbeat': {
         'task': 'site_heartbeat',
         'schedule': 5,
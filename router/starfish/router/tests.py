@@ -1,4 +1,6 @@
-from django.test import TestCase
+from functools import lru_cache
+
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase
 from rest_framework import status
@@ -7,6 +9,16 @@ from uuid import uuid4
 from starfish.router.models import Site, Project
 
 
+@lru_cache(maxsize=1)
+def unapplied_migrations():
+    """Migration plan left on the test database, the graph loaded once per run"""
+    from django.db.migrations.executor import MigrationExecutor
+    from django.db import connection
+
+    executor = MigrationExecutor(connection)
+    return tuple(executor.migration_plan(executor.loader.graph.leaf_nodes()))
+
+
 class DatabaseConnectionTest(TestCase):
     """Test that database is connected and migrations are applied"""
 
@@ -18,19 +30,20 @@ class DatabaseConnectionTest(TestCase):
 
     def test_migrations_applied(self):
         """Ensure all migrations have been applied"""
-        from django.db.migrations.executor import MigrationExecutor
-        from django.db import connection
-        
-        executor = MigrationExecutor(connection)
-        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
-        self.assertEqual(len(plan), 0, "Unapplied migrations found")
+        self.assertEqual(len(unapplied_migrations()), 0, "Unapplied migrations found")
+
 
+# fixtures are created once per class; a fast hasher keeps create_user cheap
+fast_password_hashers = ['django.contrib.auth.hashers.MD5PasswordHasher']
 
+
+@override_settings(PASSWORD_HASHERS=fast_password_hashers)
 class SiteModelTest(TestCase):
     """Test core Site functionality"""
 
-    def setUp(self):
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
             username='testuser',
             password='testpass123'
         )
@@ -48,19 +61,21 @@ class SiteModelTest(TestCase):
         self.assertIsNotNone(site.created_at)
 
 
+@override_settings(PASSWORD_HASHERS=fast_password_hashers)
 class ProjectModelTest(TestCase):
     """Test core Project functionality"""
 
-    def setUp(self):
-        self.user = User.objects.create_user(
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
             username='testuser',
             password='testpass123'
         )
-        self.site = Site.objects.create(
+        cls.site = Site.objects.create(
             name='Test Site',
             description='A test site',
             uid=uuid4(),
-            owner=self.user
+            owner=cls.user
         )
 
     def test_project_creation(self):